@@ -320,5 +320,6 @@ def main():
 # the above functions
     
 # program will start at the following main() function call
-# when you execute hw1.py
-main()
\ No newline at end of file
+# when you execute hw1.py (the guard lets recommender.py import these functions without running the tests)
+if __name__ == '__main__':
+    main()
\ No newline at end of file
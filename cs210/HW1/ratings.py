@@ -0,0 +1,287 @@
+from array import array
+from collections.abc import Mapping
+
+import numpy as np
+
+from snapshot import StringTable, pack_strings
+
+# Dense integer ids for names, in order of first appearance
+class Interner:
+    def __init__(self, names=None):
+        # Names by id, and the reverse lookup, built on first use when starting from existing names
+        self.names = [] if names is None else names
+        self._ids = {} if names is None else None
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = {name: number for number, name in enumerate(self.names)}
+        return self._ids
+
+    def __len__(self):
+        return len(self.names)
+
+    # Return the id of a name, numbering it if new
+    def intern(self, name):
+        number = self.ids.get(name)
+        if number is None:
+            number = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return number
+
+# Ratings kept as parallel typed arrays of user id, movie id and rating, with movies, users and genres interned to
+# dense ids. About 16 bytes per rating, against a tuple, a float and a list slot per rating in read_user_ratings.
+# The views below give the dict shapes hw1.py's functions take. A store loaded from a snapshot is read-only: its arrays
+# are NumPy views of the mapped file.
+class RatingStore:
+    def __init__(self):
+        self.users = Interner()
+        self.movies = Interner()
+        self.genres = Interner()
+        # One entry per rating, in file order
+        self.user_ids = array('i')
+        self.movie_ids = array('i')
+        self.ratings = array('d')
+        # Per movie id: genre id, -1 if the movie is not in the genre file
+        self.movie_genre = array('i')
+        # Rating positions grouped by user and by movie, built on first use: (order, offsets)
+        self._by_user = None
+        self._by_movie = None
+        # Per movie id: average rating, NaN if unrated, built on first use
+        self._averages = None
+
+    # Load a movie|rating|user file and optionally a genre|id|movie file, parsing each once like hw1.py does
+    @classmethod
+    def from_files(cls, ratings_file, genre_file=None):
+        store = cls()
+        if genre_file is not None:
+            with open(genre_file, 'r') as file:
+                for line in file:
+                    genre, _, movie = line.strip().split('|')
+                    store.set_genre(movie.strip(), genre.strip())
+        with open(ratings_file, 'r') as file:
+            for line in file:
+                movie, rating, user_id = line.strip().split('|')
+                store.add(movie.strip(), float(rating.strip()), user_id.strip())
+        return store
+
+    # Intern a movie, growing the per-movie genre table with it
+    def movie_id(self, movie):
+        number = self.movies.intern(movie)
+        if number == len(self.movie_genre):
+            self.movie_genre.append(-1)
+        return number
+
+    # Record a movie's genre; a later line for the same movie wins, as in read_movie_genre
+    def set_genre(self, movie, genre):
+        self.movie_genre[self.movie_id(movie)] = self.genres.intern(genre)
+
+    # Append one rating
+    def add(self, movie, rating, user_id):
+        self.user_ids.append(self.users.intern(user_id))
+        self.movie_ids.append(self.movie_id(movie))
+        self.ratings.append(rating)
+        self._by_user = self._by_movie = self._averages = None
+
+    # A NumPy view of one of the rating arrays
+    @staticmethod
+    def as_array(values, dtype):
+        return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+    # Rating positions sorted by key id, stably so each group stays in file order, and where each group starts
+    @classmethod
+    def group(cls, key_ids, num_keys):
+        keys = cls.as_array(key_ids, np.int32)
+        order = np.argsort(keys, kind='stable')
+        offsets = np.zeros(num_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=num_keys), out=offsets[1:])
+        return order, offsets
+
+    def by_user(self):
+        if self._by_user is None:
+            self._by_user = self.group(self.user_ids, len(self.users))
+        return self._by_user
+
+    def by_movie(self):
+        if self._by_movie is None:
+            self._by_movie = self.group(self.movie_ids, len(self.movies))
+        return self._by_movie
+
+    # Per movie id: the average rating as calculate_average_rating computes it, with sum(), or NaN if unrated
+    def average_ratings(self):
+        if self._averages is None:
+            order, offsets = self.by_movie()
+            ratings = self.as_array(self.ratings, np.float64)
+            bounds = offsets.tolist()
+            # One movie's ratings at a time, so only the largest movie's ratings are ever Python floats at once
+            self._averages = np.array([sum(ratings[order[start:end]].tolist()) / (end - start) if end > start
+                                       else np.nan for start, end in zip(bounds, bounds[1:])], dtype=np.float64)
+        return self._averages
+
+    # Rated movie ids in order of first rating, the order read_ratings_data lists movies in
+    def rated_movies(self):
+        order, offsets = self.by_movie()
+        movie_ids = np.argsort(self.first_positions(order, offsets), kind='stable')
+        return movie_ids[offsets[movie_ids + 1] > offsets[movie_ids]]
+
+    # Same as calculate_average_rating(read_ratings_data(f)): movie -> average rating
+    def movie_averages(self):
+        names = self.movies.names
+        movie_ids = self.rated_movies()
+        return dict(zip((names[movie_id] for movie_id in movie_ids.tolist()),
+                        self.average_ratings()[movie_ids].tolist()))
+
+    # Position of each group's first rating (len(order) for empty groups), to list groups in order of appearance
+    @staticmethod
+    def first_positions(order, offsets):
+        starts = offsets[:-1]
+        firsts = np.full(len(starts), len(order), dtype=np.int64)
+        nonempty = offsets[1:] > starts
+        firsts[nonempty] = order[starts[nonempty]]
+        return firsts
+
+    # Dict-shaped views for hw1.py's functions
+    def user_to_movies(self):
+        return UserRatingsView(self)
+
+    def movie_to_ratings(self):
+        return MovieRatingsView(self)
+
+    def movie_to_genre(self):
+        return MovieGenreView(self)
+
+    def movie_to_average_rating(self):
+        return MovieAverageView(self)
+
+    # Everything above as named arrays, for a snapshot
+    def sections(self):
+        sections = {}
+        for name in ('users', 'movies', 'genres'):
+            sections[f'{name}_data'], sections[f'{name}_offsets'] = pack_strings(getattr(self, name).names)
+        sections['user_ids'] = self.as_array(self.user_ids, np.int32)
+        sections['movie_ids'] = self.as_array(self.movie_ids, np.int32)
+        sections['ratings'] = self.as_array(self.ratings, np.float64)
+        sections['movie_genre'] = self.as_array(self.movie_genre, np.int32)
+        sections['by_user_order'], sections['by_user_offsets'] = self.by_user()
+        sections['by_movie_order'], sections['by_movie_offsets'] = self.by_movie()
+        sections['averages'] = self.average_ratings()
+        return sections
+
+    # A read-only store over snapshot sections, without parsing or copying the ratings
+    @classmethod
+    def from_sections(cls, sections):
+        store = cls()
+        for name in ('users', 'movies', 'genres'):
+            setattr(store, name, Interner(StringTable(sections[f'{name}_data'], sections[f'{name}_offsets'])))
+        store.user_ids = sections['user_ids']
+        store.movie_ids = sections['movie_ids']
+        store.ratings = sections['ratings']
+        store.movie_genre = sections['movie_genre']
+        store._by_user = sections['by_user_order'], sections['by_user_offsets']
+        store._by_movie = sections['by_movie_order'], sections['by_movie_offsets']
+        store._averages = sections['averages']
+        return store
+
+# user -> [(movie, rating), ...] in file order, like read_user_ratings; users appear in order of first rating
+class UserRatingsView(Mapping):
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, user_id):
+        number = self.store.users.ids[user_id]
+        order, offsets = self.store.by_user()
+        positions = order[offsets[number]:offsets[number + 1]]
+        names = self.store.movies.names
+        movie_ids = RatingStore.as_array(self.store.movie_ids, np.int32)[positions].tolist()
+        ratings = RatingStore.as_array(self.store.ratings, np.float64)[positions].tolist()
+        return [(names[movie_id], rating) for movie_id, rating in zip(movie_ids, ratings)]
+
+    def __iter__(self):
+        return iter(self.store.users.names)
+
+    def __len__(self):
+        return len(self.store.users)
+
+    def __contains__(self, user_id):
+        return user_id in self.store.users.ids
+
+    # The listed users' ratings as arrays of position in user_ids, movie id and rating, each user's in file order
+    def flatten(self, user_ids):
+        order, offsets = self.store.by_user()
+        numbers = np.fromiter((self.store.users.ids[user_id] for user_id in user_ids), dtype=np.int64,
+                              count=len(user_ids))
+        starts = offsets[numbers]
+        lengths = offsets[numbers + 1] - starts
+        rows = np.repeat(np.arange(len(user_ids)), lengths)
+        # Walk each user's run of the grouped order
+        steps = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = order[np.repeat(starts, lengths) + steps]
+        movie_ids = RatingStore.as_array(self.store.movie_ids, np.int32)[positions]
+        ratings = RatingStore.as_array(self.store.ratings, np.float64)[positions]
+        return rows, movie_ids, ratings
+
+# movie -> [rating, ...] in file order, like read_ratings_data; movies appear in order of first rating
+class MovieRatingsView(Mapping):
+    def __init__(self, store):
+        self.store = store
+        self.movie_ids = store.rated_movies().tolist()
+        self.rated = set(self.movie_ids)
+
+    def __getitem__(self, movie):
+        number = self.store.movies.ids.get(movie)
+        if number not in self.rated:
+            raise KeyError(movie)
+        order, offsets = self.store.by_movie()
+        return RatingStore.as_array(self.store.ratings, np.float64)[order[offsets[number]:offsets[number + 1]]].tolist()
+
+    def __iter__(self):
+        return (self.store.movies.names[movie_id] for movie_id in self.movie_ids)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __contains__(self, movie):
+        return self.store.movies.ids.get(movie) in self.rated
+
+# movie -> genre for the movies in the genre file, in file order like read_movie_genre
+class MovieGenreView(Mapping):
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, movie):
+        number = self.store.movies.ids.get(movie)
+        if number is None or self.store.movie_genre[number] < 0:
+            raise KeyError(movie)
+        return self.store.genres.names[int(self.store.movie_genre[number])]
+
+    def __iter__(self):
+        names = self.store.movies.names
+        has_genre = RatingStore.as_array(self.store.movie_genre, np.int32) >= 0
+        return (names[number] for number in np.flatnonzero(has_genre).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(RatingStore.as_array(self.store.movie_genre, np.int32) >= 0))
+
+    def __contains__(self, movie):
+        number = self.store.movies.ids.get(movie)
+        return number is not None and self.store.movie_genre[number] >= 0
+
+# movie -> average rating, like calculate_average_rating(read_ratings_data(f)); movies appear in order of first rating
+class MovieAverageView(Mapping):
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, movie):
+        number = self.store.movies.ids.get(movie)
+        _, offsets = self.store.by_movie()
+        if number is None or offsets[number + 1] == offsets[number]:
+            raise KeyError(movie)
+        return float(self.store.average_ratings()[number])
+
+    def __iter__(self):
+        names = self.store.movies.names
+        return (names[movie_id] for movie_id in self.store.rated_movies().tolist())
+
+    def __len__(self):
+        _, offsets = self.store.by_movie()
+        return int(np.count_nonzero(offsets[1:] > offsets[:-1]))
@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from ratings import RatingStore, UserRatingsView
+from snapshot import StringTable, pack_strings, read_snapshot, source_fingerprint, write_snapshot
+
+# Number of movies recommended to each user, as in recommend_movies
+NUM_RECOMMENDATIONS = 3
+# Users handed to a pool worker per task
+SHARD_SIZE = 1000
+# Write buffer size for streamed output
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Genre averages this close (relative) to a user's best are rechecked the way get_user_genre computes them,
+# since NumPy sums may round differently from sum() and ties must go to the first genre the user rated
+TIE_TOLERANCE = 1e-9
+# Ratings that are multiples of 2**-EXACT_BITS (e.g. whole and half stars) add up without rounding error
+EXACT_BITS = 20
+
+# Genre lookups built once from read_movie_genre and calculate_average_rating output, so each query is a short walk
+# or a slice instead of a scan over every movie. Movies with equal average ratings keep the order of the genre file,
+# like get_popular_in_genre. (recommend_movies breaks such ties by set iteration order, which changes with string
+# hashing between runs, so only the order among equally rated movies can differ from it.)
+class RecommenderIndex:
+    def __init__(self, movie_to_genre, movie_to_average_rating):
+        self.movie_to_genre = movie_to_genre
+        self.movie_to_average_rating = movie_to_average_rating
+        # Per genre: its rated movies in file order, the same lists create_genre_dict would give
+        genre_ratings = {}
+        for movie, genre in movie_to_genre.items():
+            ratings = genre_ratings.setdefault(genre, [])
+            if movie in movie_to_average_rating:
+                ratings.append((movie, movie_to_average_rating[movie]))
+        # Genres in file order, and each movie's genre as a position in that list
+        self.genres = list(genre_ratings)
+        columns = {genre: column for column, genre in enumerate(self.genres)}
+        self.genre_column = {movie: columns[genre] for movie, genre in movie_to_genre.items()}
+        # Per genre: (movie, average rating) from highest to lowest rating; the stable sort keeps ties in file order
+        self.genre_movies = {genre: sorted(ratings, key=lambda x: x[1], reverse=True)
+                             for genre, ratings in genre_ratings.items()}
+        # Per genre: average of its movies' average ratings, summed in file order like get_genre_rating
+        self.genre_rating = {genre: sum(rating for _, rating in ratings) / len(ratings) if ratings else 0
+                             for genre, ratings in genre_ratings.items()}
+        # genre_column by movie id of the store last passed to movie_columns, and that store
+        self._movie_columns = None
+        self._columns_store = None
+
+    # Per movie id of a store: the movie's genre column, -1 for movies without a genre. Built once per store, so
+    # batches of users index an array instead of looking up every movie name again.
+    def movie_columns(self, store):
+        if self._columns_store is not store:
+            self._movie_columns = np.fromiter((self.genre_column.get(movie, -1) for movie in store.movies.names),
+                                              dtype=np.int32, count=len(store.movies))
+            self._columns_store = store
+        return self._movie_columns
+
+    # A copy with only the genre lookups that recommending from (movie, rating) lists needs, as plain dicts. Pool
+    # workers get this rather than the index, whose movie views would pickle the whole ratings store with it.
+    def lookups(self):
+        index = RecommenderIndex.__new__(RecommenderIndex)
+        index.movie_to_genre = index.movie_to_average_rating = None
+        index.genres = list(self.genres)
+        index.genre_column = dict(self.genre_column)
+        index.genre_movies = {genre: list(movies) for genre, movies in self.genre_movies.items()}
+        index.genre_rating = dict(self.genre_rating)
+        index._movie_columns = index._columns_store = None
+        return index
+
+    # The index as named arrays for a snapshot, with movies as ids of the store it was built from
+    def sections(self, store):
+        movie_ids = store.movies.ids
+        sections = {}
+        sections['index_genres_data'], sections['index_genres_offsets'] = pack_strings(self.genres)
+        sections['genre_column'] = self.movie_columns(store)
+        ranked = [self.genre_movies[genre] for genre in self.genres]
+        offsets = np.zeros(len(ranked) + 1, dtype=np.int64)
+        np.cumsum([len(movies) for movies in ranked], out=offsets[1:])
+        sections['genre_movie_offsets'] = offsets
+        sections['genre_movie_ids'] = np.array([movie_ids[movie] for movies in ranked for movie, _ in movies],
+                                               dtype=np.int32)
+        sections['genre_movie_ratings'] = np.array([rating for movies in ranked for _, rating in movies],
+                                                   dtype=np.float64)
+        sections['genre_rating'] = np.array([self.genre_rating[genre] for genre in self.genres], dtype=np.float64)
+        return sections
+
+    # An index over snapshot sections, without re-ranking any genre or building per-movie lookups: movies are looked
+    # up in the mapped arrays when asked for
+    @classmethod
+    def from_sections(cls, store, sections):
+        index = cls.__new__(cls)
+        index.movie_to_genre = store.movie_to_genre()
+        index.movie_to_average_rating = store.movie_to_average_rating()
+        index.genres = list(StringTable(sections['index_genres_data'], sections['index_genres_offsets']))
+        genre_column = sections['genre_column']
+        index.genre_column = GenreColumnView(store.movies, genre_column)
+        offsets = sections['genre_movie_offsets'].tolist()
+        movie_ids = sections['genre_movie_ids']
+        ratings = sections['genre_movie_ratings']
+        index.genre_movies = {genre: RankedMovies(store.movies.names, movie_ids[start:end], ratings[start:end])
+                              for genre, start, end in zip(index.genres, offsets, offsets[1:])}
+        index.genre_rating = dict(zip(index.genres, sections['genre_rating'].tolist()))
+        index._movie_columns = genre_column
+        index._columns_store = store
+        return index
+
+    # Same as get_popular_in_genre: the n best rated movies of a genre
+    def popular_in_genre(self, genre, n=5):
+        return dict(self.genre_movies.get(genre, [])[:n])
+
+    # Same as genre_popularity: the n genres with the highest average rating
+    def popular_genres(self, n=5):
+        return dict(sorted(self.genre_rating.items(), key=lambda x: x[1], reverse=True)[:n])
+
+    # Same as get_user_genre: the genre with the user's highest average rating, the first one seen on ties
+    def user_genre(self, user_id, user_to_movies):
+        if user_id not in user_to_movies:
+            return None
+        genre_ratings = {}
+        for movie, rating in user_to_movies[user_id]:
+            column = self.genre_column.get(movie)
+            if column is not None:
+                genre_ratings.setdefault(self.genres[column], []).append(rating)
+        genre_avg = {genre: sum(ratings) / len(ratings) for genre, ratings in genre_ratings.items()}
+        if not genre_avg:
+            return None
+        return max(genre_avg.items(), key=lambda x: x[1])[0]
+
+    # Same as recommend_movies: the best rated movies of the user's top genre that the user has not rated
+    def recommend(self, user_id, user_to_movies, n=NUM_RECOMMENDATIONS):
+        return self.recommend_in_genre(self.user_genre(user_id, user_to_movies), user_to_movies.get(user_id, []), n)
+
+    # The best rated movies of a genre missing from a user's (movie, rating) list
+    def recommend_in_genre(self, top_genre, user_movies, n=NUM_RECOMMENDATIONS):
+        if not top_genre:
+            return {}
+        rated_movies = set(movie for movie, _ in user_movies)
+        recommendations = {}
+        # Walk down the genre's ranking, skipping movies the user has rated
+        for movie, rating in self.genre_movies.get(top_genre, []):
+            if len(recommendations) == n:
+                break
+            if movie not in rated_movies:
+                recommendations[movie] = rating
+        return recommendations
+
+# movie -> genre column over a per-movie-id column array, for the movies that have a genre
+class GenreColumnView(Mapping):
+    def __init__(self, movies, columns):
+        self.movies = movies
+        self.columns = columns
+
+    def __getitem__(self, movie):
+        number = self.movies.ids.get(movie)
+        if number is None or self.columns[number] < 0:
+            raise KeyError(movie)
+        return int(self.columns[number])
+
+    def __iter__(self):
+        names = self.movies.names
+        return (names[number] for number in np.flatnonzero(self.columns >= 0).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(self.columns >= 0))
+
+# One genre's (movie, rating) ranking over arrays of movie ids and ratings, read in growing chunks, so walking the top
+# of the ranking does not convert the rest of it
+class RankedMovies(Sequence):
+    def __init__(self, names, movie_ids, ratings):
+        self.names = names
+        self.movie_ids = movie_ids
+        self.ratings = ratings
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [self[position] for position in range(len(self))[number]]
+        return self.names[int(self.movie_ids[number])], float(self.ratings[number])
+
+    def __iter__(self):
+        start, size = 0, 8
+        while start < len(self):
+            movie_ids = self.movie_ids[start:start + size].tolist()
+            yield from zip((self.names[movie_id] for movie_id in movie_ids),
+                           self.ratings[start:start + size].tolist())
+            start += size
+            size *= 2
+
+# Top genre of each listed user, as get_user_genre would pick it, from user x genre rating sums and counts
+def user_genres(user_ids, user_to_movies, index):
+    # Flatten the users' ratings into arrays of user row, genre column (-1 for movies without a genre) and rating
+    if isinstance(user_to_movies, UserRatingsView):
+        # Straight from the store's arrays, mapping interned movie ids to columns
+        rows, movie_ids, ratings = user_to_movies.flatten(user_ids)
+        columns = index.movie_columns(user_to_movies.store)[movie_ids].astype(np.int64)
+    else:
+        user_movies = [user_to_movies[user_id] for user_id in user_ids]
+        pairs = [pair for movies in user_movies for pair in movies]
+        rows = np.repeat(np.arange(len(user_ids)), [len(movies) for movies in user_movies])
+        columns = np.fromiter((index.genre_column.get(movie, -1) for movie, _ in pairs), dtype=np.int64,
+                              count=len(pairs))
+        ratings = np.fromiter((rating for _, rating in pairs), dtype=np.float64, count=len(pairs))
+    has_genre = columns >= 0
+    num_genres = len(index.genres)
+    num_cells = len(user_ids) * num_genres
+    cells = rows[has_genre] * num_genres + columns[has_genre]
+    ratings = ratings[has_genre]
+    sums = np.bincount(cells, weights=ratings, minlength=num_cells)
+    counts = np.bincount(cells, minlength=num_cells)
+    # Cells whose ratings are all multiples of 2**-EXACT_BITS sum without rounding, so NumPy agrees with sum() there
+    inexact = np.bincount(cells, weights=np.round(ratings * 2 ** EXACT_BITS) != ratings * 2 ** EXACT_BITS,
+                          minlength=num_cells)
+    exact = (inexact == 0) & (np.abs(sums) < 2 ** (52 - EXACT_BITS))
+    # Position of each user's first rating in each genre, which decides ties like the dict order in get_user_genre
+    first = np.full(num_cells, len(cells))
+    unique_cells, first_positions = np.unique(cells, return_index=True)
+    first[unique_cells] = first_positions
+    # Average per user and genre, -inf where the user rated nothing in the genre
+    averages = np.full(num_cells, -np.inf)
+    np.divide(sums, counts, out=averages, where=counts > 0)
+    shape = (len(user_ids), num_genres)
+    averages, exact, first = averages.reshape(shape), exact.reshape(shape), first.reshape(shape)
+    best = averages.max(axis=1, initial=-np.inf)[:, None]
+    near = averages >= best - TIE_TOLERANCE * np.abs(best)
+    tied = averages == best
+    # A single genre near the best wins outright; exact ties among exactly summed genres go to the first one rated
+    settled = (near.sum(axis=1) == 1) | ((near == tied).all(axis=1) & (exact | ~tied).all(axis=1))
+    top_columns = np.where(tied, first, len(cells)).argmin(axis=1) if num_genres else np.zeros(len(user_ids), int)
+    top_genres = []
+    for row, user_id in enumerate(user_ids):
+        if best[row, 0] == -np.inf:
+            top_genres.append(None)
+        elif settled[row]:
+            top_genres.append(index.genres[top_columns[row]])
+        else:
+            # Averages too close to call from NumPy's sums: recompute like get_user_genre
+            top_genres.append(index.user_genre(user_id, user_to_movies))
+    return top_genres
+
+# Load the ratings store and index from the two source files, through a snapshot if one is given: a snapshot built
+# from the current files is mapped instead of parsing them, and a missing or stale one is rebuilt
+def load_model(ratings_file, genre_file, snapshot_location=None):
+    fingerprint = source_fingerprint([ratings_file, genre_file])
+    if snapshot_location:
+        model = load_snapshot(snapshot_location, fingerprint)
+        if model is not None:
+            return model
+    store = RatingStore.from_files(ratings_file, genre_file)
+    index = RecommenderIndex(store.movie_to_genre(), store.movie_averages())
+    if snapshot_location:
+        write_snapshot(snapshot_location, {**store.sections(), **index.sections(store)}, fingerprint)
+    return store, index
+
+# The (store, index) saved in a snapshot, or None if it does not match the fingerprint
+def load_snapshot(snapshot_location, fingerprint=None):
+    sections = read_snapshot(snapshot_location, fingerprint)
+    if sections is None:
+        return None
+    store = RatingStore.from_sections(sections)
+    return store, RecommenderIndex.from_sections(store, sections)
+
+_worker_index = None
+_worker_user_to_movies = None
+
+# Give a pool worker its copy of the index, or have it map the snapshot the parent loaded
+def _init_worker(index, snapshot_location=None):
+    global _worker_index, _worker_user_to_movies
+    if snapshot_location is not None:
+        store, index = load_snapshot(snapshot_location)
+        _worker_user_to_movies = store.user_to_movies()
+    _worker_index = index
+
+# Recommend to the listed users, returning a JSON line per user
+def recommend_users(user_ids, user_to_movies, index, n=NUM_RECOMMENDATIONS):
+    lines = []
+    for user_id, top_genre in zip(user_ids, user_genres(user_ids, user_to_movies, index)):
+        recommendations = index.recommend_in_genre(top_genre, user_to_movies[user_id], n)
+        lines.append(json.dumps({'user': user_id, 'genre': top_genre, 'recommendations': recommendations}) + '\n')
+    return lines
+
+# Recommend to one shard of (user, ratings) pairs, returning a JSON line per user
+def recommend_shard(user_ratings, index=None, n=NUM_RECOMMENDATIONS):
+    # Fall back to the index handed to this worker process
+    if index is None:
+        index = _worker_index
+    user_to_movies = dict(user_ratings)
+    return recommend_users(list(user_to_movies), user_to_movies, index, n)
+
+# Recommend to a shard of users in the snapshot this worker mapped
+def recommend_snapshot_shard(user_ids, n=NUM_RECOMMENDATIONS):
+    return recommend_users(user_ids, _worker_user_to_movies, _worker_index, n)
+
+# Recommend to every user, writing JSON Lines in user order as shards finish. Given the snapshot that user_to_movies
+# and index were loaded from, workers map it and receive only user ids instead of copies of the ratings.
+def recommend_all(user_to_movies, index, output_location, workers=1, shard_size=SHARD_SIZE, n=NUM_RECOMMENDATIONS,
+                  snapshot_location=None):
+    user_ids = list(user_to_movies)
+    id_shards = [user_ids[start:start + shard_size] for start in range(0, len(user_ids), shard_size)]
+    with open(output_location, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+        if workers <= 1 or len(id_shards) <= 1:
+            # In process, shards read the user view directly instead of copying out (user, ratings) pairs
+            for shard in id_shards:
+                f.writelines(recommend_users(shard, user_to_movies, index, n))
+            return
+        if snapshot_location is not None:
+            initargs = (None, snapshot_location)
+            results = lambda pool: pool.map(recommend_snapshot_shard, id_shards, repeat(n))
+        else:
+            initargs = (index.lookups(),)
+            shards = ([(user_id, user_to_movies[user_id]) for user_id in shard] for shard in id_shards)
+            results = lambda pool: pool.map(recommend_shard, shards, repeat(None), repeat(n))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            # map keeps results in shard order, so output does not depend on the worker count
+            for lines in results(pool):
+                f.writelines(lines)
+
+# Recommend to every user in the ratings file
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Recommend movies to every user in a ratings file')
+    parser.add_argument('--ratings', default=os.path.join(here, 'movieRatingSample.txt'),
+                        help='movie|rating|user ratings file')
+    parser.add_argument('--genres', default=os.path.join(here, 'genreMovieSample.txt'),
+                        help='genre|id|movie genre file')
+    parser.add_argument('--output', help='write one JSON line per user here instead of printing')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes recommending shards of users')
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='users per shard')
+    parser.add_argument('--snapshot', help='binary snapshot of the parsed files, mapped instead of parsing when it is '
+                                           'up to date and rebuilt otherwise')
+    args = parser.parse_args()
+
+    # One pass over each file into interned, array-backed storage gives the averages and the per-user view
+    store, index = load_model(args.ratings, args.genres, args.snapshot)
+    user_to_movies = store.user_to_movies()
+    if args.output:
+        recommend_all(user_to_movies, index, args.output, args.workers, args.shard_size,
+                      snapshot_location=args.snapshot)
+        return
+    print("\nRecommendations:")
+    for user_id in user_to_movies:
+        print(f"   {user_id}: {index.recommend(user_id, user_to_movies)}")
+
+if __name__ == '__main__':
+    main()
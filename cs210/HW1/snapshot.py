@@ -0,0 +1,115 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+
+import numpy as np
+
+# Binary snapshot files: a header naming the source files they were built from and where each array section lies,
+# then the sections themselves, each aligned so it can be used in place from a read-only memory map. Processes that
+# map the same snapshot share its pages through the OS page cache instead of each holding a parsed copy.
+#
+#   magic (8 bytes) | format version (uint32) | header length (uint64) | JSON header | padding | sections
+#
+# All sections are little-endian.
+SNAPSHOT_MAGIC = b'HW1SNAP\n'
+# Bump whenever the layout or the meaning of a section changes, so older snapshots are rebuilt
+SNAPSHOT_VERSION = 1
+# Section alignment in bytes
+ALIGNMENT = 64
+PREFIX = struct.Struct('<8sIQ')
+
+# Size and modification time of each source file, which a snapshot must match to be used
+def source_fingerprint(sources):
+    fingerprint = []
+    for path in sources:
+        stat = os.stat(path)
+        fingerprint.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+# Round up to the next section boundary
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+# Write named NumPy arrays, replacing any old snapshot atomically. Take the fingerprint before reading the sources, so
+# a file changed while it was parsed makes the snapshot stale.
+def write_snapshot(file_location, sections, fingerprint):
+    table = {}
+    offset = 0
+    arrays = []
+    for name, values in sections.items():
+        values = np.ascontiguousarray(values)
+        values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+        table[name] = {'dtype': values.dtype.str, 'offset': offset, 'length': len(values)}
+        arrays.append((offset, values))
+        offset = aligned(offset + values.nbytes)
+    header = json.dumps({'sources': fingerprint, 'sections': table}).encode()
+    data_start = aligned(PREFIX.size + len(header))
+    temp_location = f'{file_location}.tmp'
+    with open(temp_location, 'wb') as file:
+        file.write(PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        file.write(header)
+        for section_offset, values in arrays:
+            file.seek(data_start + section_offset)
+            file.write(values.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(temp_location, file_location)
+
+# Map a snapshot and return its sections, or None if it is missing, from another format version, or does not match
+# the given source fingerprint (None skips that check). Sections are read-only arrays backed by the map.
+def read_snapshot(file_location, fingerprint=None):
+    try:
+        with open(file_location, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):  # ValueError: empty file
+        return None
+    if len(mapped) < PREFIX.size:
+        return None
+    magic, version, header_length = PREFIX.unpack_from(mapped)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+    header = json.loads(mapped[PREFIX.size:PREFIX.size + header_length])
+    if fingerprint is not None and header['sources'] != fingerprint:
+        return None
+    data_start = aligned(PREFIX.size + header_length)
+    sections = {}
+    for name, section in header['sections'].items():
+        dtype = np.dtype(section['dtype'])
+        if section['length'] == 0:
+            sections[name] = np.zeros(0, dtype=dtype)
+            continue
+        sections[name] = np.frombuffer(mapped, dtype=dtype, count=section['length'],
+                                       offset=data_start + section['offset'])
+    return sections
+
+# Strings as one UTF-8 byte section and an offsets section, the form StringTable reads back
+def pack_strings(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.array(bytearray(b''.join(encoded)), dtype=np.uint8), offsets
+
+# Read-only list of strings over packed bytes, decoded all at once the first time one is asked for, so loading a
+# snapshot does not pay for names it never looks up
+class StringTable(Sequence):
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self._strings = None
+
+    def strings(self):
+        if self._strings is None:
+            data = self.data.tobytes()
+            offsets = self.offsets.tolist()
+            self._strings = [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+        return self._strings
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, number):
+        return self.strings()[number]
+
+    def __iter__(self):
+        return iter(self.strings())
@@ -0,0 +1,54 @@
+import argparse
+import copy
+import csv
+import io
+import time
+
+from cleaning import ColumnStore, Pipeline
+from covid import covid_rules, date_fields
+
+# Repeat the covid data, shifting the years so dates keep growing in variety
+def build_records(copies):
+    covid_data = ColumnStore.from_csv('covidTrain.csv')
+    fieldnames = covid_data.fieldnames
+    rows = [[covid_data[name].format(row) for name in fieldnames] for row in range(len(covid_data))]
+    date_positions = [fieldnames.index(field) for field in date_fields]
+    records = []
+    for copy_number in range(copies):
+        for row in rows:
+            record = list(row)
+            for position in date_positions:
+                if record[position]:
+                    record[position] = record[position][:-4] + str(2020 + copy_number % 500)
+            records.append(record)
+    return fieldnames, records
+
+# Time the age and date tasks on one backend and report rows per second
+def time_transforms(label, vectorized, fieldnames, records, repeats):
+    transforms = [rule for rule in covid_rules(vectorized) if rule.column in ['age', *date_fields]]
+    best = float('inf')
+    for _ in range(repeats):
+        store = ColumnStore.from_records(fieldnames, copy.deepcopy(records))
+        start = time.perf_counter()
+        Pipeline(copy.deepcopy(transforms)).run(store)
+        best = min(best, time.perf_counter() - start)
+    print(f'{label:<12} {len(store) / best:>14,.0f} rows/sec  ({best:.3f}s for {len(store):,} rows)')
+    output = io.StringIO()
+    store.write_rows(csv.writer(output))
+    return output.getvalue()
+
+# Compare the pure-Python and NumPy backends on the same rows
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vectorized covid age and date tasks')
+    parser.add_argument('--copies', type=int, default=2000, help='times the covid rows are repeated')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per backend; the best is reported')
+    args = parser.parse_args()
+
+    fieldnames, records = build_records(args.copies)
+    before = time_transforms('python', False, fieldnames, records, args.repeats)
+    after = time_transforms('numpy', True, fieldnames, records, args.repeats)
+    # Both backends must produce the same table
+    assert before == after, 'vectorized transforms differ from the pure-Python ones'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import re
+import time
+
+from tfidf import fetch_text, prepare_text, stem_token
+
+# Original four-pass prepare_text, kept as the baseline to compare against
+def prepare_text_multipass(original_text, stop_list):
+    # Remove URLs, punctuation and extra whitespace, then lowercase
+    text = re.sub(r'https?://\S+', '', original_text)
+    text = re.sub(r'[^\w\s]', '', text)
+    text = re.sub(r'\s+', ' ', text.strip())
+    text = text.lower()
+    # Split into words, remove stopwords and stem every token
+    reduced = []
+    for token in text.split():
+        if token in stop_list:
+            continue
+        if token.endswith('ing'):
+            reduced.append(token[:-3])
+        elif token.endswith('ly'):
+            reduced.append(token[:-2])
+        elif token.endswith('ment'):
+            reduced.append(token[:-4])
+        else:
+            reduced.append(token)
+    return ' '.join(reduced)
+
+# Time one preprocessing function over the text and report tokens per second
+def time_tokenizer(label, prepare, text, stop_words, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = prepare(text, stop_words)
+        best = min(best, time.perf_counter() - start)
+    num_tokens = len(result.split())
+    print(f'{label:<12} {num_tokens / best:>14,.0f} tokens/sec  ({best:.3f}s for {num_tokens:,} tokens)')
+    return result
+
+# Build a large text from the sample documents and compare both tokenizers on it
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the single-pass tokenizer against the original prepare_text')
+    parser.add_argument('--copies', type=int, default=500, help='times the sample documents are repeated')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per tokenizer; the best is reported')
+    args = parser.parse_args()
+
+    stop_words = set(fetch_text('stopwords.txt').splitlines())
+    doc_list = [doc_name.strip() for doc_name in fetch_text('tfidf_docs.txt').splitlines()]
+    text = '\n'.join(fetch_text(doc_name) for doc_name in doc_list) * args.copies
+    print(f'{len(text):,} characters of text')
+
+    before = time_tokenizer('multi-pass', prepare_text_multipass, text, stop_words, args.repeats)
+    stem_token.cache_clear()
+    after = time_tokenizer('single-pass', prepare_text, text, stop_words, args.repeats)
+    print(f'stem cache: {stem_token.cache_info()}')
+    # Both tokenizers must produce the same text
+    assert before == after, 'single-pass tokenizer output differs from the original'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+
+from cleaning import NumericColumn
+
+# ------------------------------------------------------------
+# Bitmap-Indexed Query Table
+# ------------------------------------------------------------
+
+class BitmapTable:
+    """Read-only indexes over a ColumnStore for repeated filter/aggregate questions.
+
+    Filters return bitmaps (NumPy uint8 arrays, one bit per row), so conjunctions are `a & b`, disjunctions `a | b`,
+    and aggregates only read the rows whose bits are set. Categorical columns get one bitmap per distinct value,
+    numeric columns a sorted index for range filters. The store must not change after the table is built."""
+
+    def __init__(self, store, categorical=(), numeric=()):
+        self.store = store
+        self.num_rows = len(store)
+        # Per categorical column: value -> bitmap of the rows holding it
+        self.bitmaps = {name: self.value_bitmaps(store[name]) for name in categorical}
+        # Per numeric column: rows with a value ordered by value, and the values in that order
+        self.sorted_rows = {}
+        self.sorted_values = {}
+        for name in numeric:
+            rows, values = self.present_values(name)
+            order = np.argsort(values, kind='stable')
+            self.sorted_rows[name] = rows[order]
+            self.sorted_values[name] = values[order]
+
+    def bitmap_of(self, rows):
+        """Return the bitmap with the given rows set."""
+        mask = np.zeros(self.num_rows, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask, bitorder='little')
+
+    def value_bitmaps(self, column):
+        """Build one bitmap per distinct value of a column, keyed like column.get."""
+        rows_by_value = {}
+        for row in range(self.num_rows):
+            value = column.get(row)
+            if value is not None:
+                rows_by_value.setdefault(value, []).append(row)
+        return {value: self.bitmap_of(rows) for value, rows in rows_by_value.items()}
+
+    def present_values(self, name):
+        """Return the rows of a numeric column that have a value, and those values, as arrays."""
+        column = self.store[name]
+        if not isinstance(column, NumericColumn):
+            raise ValueError(f"column {name!r} is not numeric")
+        values = np.frombuffer(column.values, dtype=np.float64)
+        rows = np.flatnonzero(np.frombuffer(column.missing, dtype=np.uint8) == 0)
+        return rows, values[rows]
+
+    # Filters
+
+    def everything(self):
+        """Return the bitmap of all rows."""
+        return self.bitmap_of(slice(None))
+
+    def equals(self, name, value):
+        """Return the bitmap of rows whose indexed categorical column holds value."""
+        bitmap = self.bitmaps[name].get(value)
+        return bitmap if bitmap is not None else self.bitmap_of([])
+
+    def is_in(self, name, values):
+        """Return the bitmap of rows holding any of the values."""
+        result = self.bitmap_of([])
+        for value in values:
+            result = result | self.equals(name, value)
+        return result
+
+    def present(self, name):
+        """Return the bitmap of rows where a column has a value."""
+        if name in self.sorted_rows:
+            return self.bitmap_of(self.sorted_rows[name])
+        column = self.store[name]
+        return self.bitmap_of([row for row in range(self.num_rows) if not column.is_missing(row)])
+
+    def in_range(self, name, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """Return the bitmap of rows whose indexed numeric column lies between low and high; None is unbounded."""
+        values = self.sorted_values[name]
+        start = 0 if low is None else np.searchsorted(values, low, side='left' if low_inclusive else 'right')
+        end = len(values) if high is None else np.searchsorted(values, high, side='right' if high_inclusive else 'left')
+        return self.bitmap_of(self.sorted_rows[name][start:end])
+
+    # Aggregates
+
+    def rows(self, bitmap):
+        """Return the row numbers set in a bitmap, in order."""
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.num_rows, bitorder='little'))
+
+    def count(self, bitmap):
+        """Return the number of rows set in a bitmap."""
+        return int(np.bitwise_count(bitmap).sum())
+
+    def values(self, name, bitmap):
+        """Return the non-missing values of a column on the bitmap's rows, in row order."""
+        column = self.store[name]
+        return [value for value in map(column.get, self.rows(bitmap)) if value is not None]
+
+    def mean(self, name, bitmap):
+        """Return the mean of a numeric column over the bitmap's rows that have a value, or None if there are none.
+
+        The sum is exactly rounded, like GroupMeanFill's, rather than NumPy's pairwise sum, so fills agree with it."""
+        selected = self.rows(bitmap & self.present(name))
+        if not len(selected):
+            return None
+        return math.fsum(np.frombuffer(self.store[name].values, dtype=np.float64)[selected].tolist()) / len(selected)
+
+    def value_counts(self, name, bitmap):
+        """Count each value of an indexed categorical column over the bitmap's rows, skipping absent values."""
+        counts = {}
+        for value, value_bitmap in self.bitmaps[name].items():
+            count = self.count(value_bitmap & bitmap)
+            if count:
+                counts[value] = count
+        return counts
@@ -0,0 +1,1188 @@
+import csv
+import heapq
+import json
+import math
+import os
+import shutil
+import tempfile
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+# Rows held in memory at a time when streaming a file
+STREAM_BATCH_SIZE = 100_000
+# Write buffer size for streamed output
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# ------------------------------------------------------------
+# Helper Functions (Shared across all problems)
+# ------------------------------------------------------------
+
+def is_nan(value):
+    """Check if a value is NaN (missing)."""
+    if value is None or value == "":
+        return True
+    if isinstance(value, str):  # Only call lower() if value is a string
+        return value.lower() == "nan"
+    return False  # Numeric values are not NaN in this context
+
+def round_value(value, decimals=0):
+    """Round a value to specified decimal places."""
+    return round(float(value), decimals) if value is not None and not is_nan(value) else None
+
+def add_partial(partials, value):
+    """Add a float to a running sum kept as non-overlapping partials (Shewchuk's algorithm, as math.fsum uses), so
+    math.fsum(partials) is the exactly rounded sum whatever the order values arrive in."""
+    position = 0
+    for partial in partials:
+        if abs(value) < abs(partial):
+            value, partial = partial, value
+        high = value + partial
+        low = partial - (high - value)
+        if low:
+            partials[position] = low
+            position += 1
+        value = high
+    partials[position:] = [value]
+
+def most_common_of_counts(frequency):
+    """Pick the most frequent value from a value -> count mapping. In case of a tie, return the first one alphabetically."""
+    if not frequency:
+        return None
+    max_freq = max(frequency.values())
+    most_common = [value for value, freq in frequency.items() if freq == max_freq]
+    return sorted(most_common)[0]
+
+def get_most_common(values):
+    """Find the most common value in a list. In case of a tie, return the first one alphabetically."""
+    frequency = defaultdict(int)
+    for value in values:
+        if not is_nan(value):
+            frequency[value] += 1
+    return most_common_of_counts(frequency)
+
+def load_csv(file_path):
+    """Load a CSV file into a list of dictionaries."""
+    with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        return list(reader)
+
+def save_csv(data, file_path, fieldnames):
+    """Save a list of dictionaries to a CSV file with the same format as the input."""
+    with open(file_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in data:
+            cleaned_row = {key: "" if is_nan(value) else str(value) for key, value in row.items()}
+            writer.writerow(cleaned_row)
+
+# ------------------------------------------------------------
+# Typed Columnar Storage
+# ------------------------------------------------------------
+
+class NumericColumn:
+    """Column of floats in a compact array, with a missing-value mask."""
+
+    def __init__(self):
+        self.values = array('d')
+        self.missing = bytearray()
+        # How the column writes its numbers, set by the first cell written the usual way: True for integers without
+        # ".0" (e.g. "40"), False for str(float) (e.g. "40.0"), None until then
+        self.integral = None
+        # Exact output text for the few values the column's format would write differently (e.g. "07" or an int fill)
+        self.text = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def canonical(self, number):
+        """Return the text the column's format gives a number, or None while the format is undecided."""
+        if self.integral is None:
+            return None
+        if self.integral and number.is_integer():
+            return str(int(number))
+        return str(number)
+
+    def keep_text(self, row, number, text):
+        """Remember a row's text if the column's format would not reproduce it, settling the format if undecided."""
+        if self.integral is None:
+            if number.is_integer() and text == str(int(number)):
+                self.integral = True
+            elif text == str(number):
+                self.integral = False
+        if self.canonical(number) != text:
+            self.text[row] = text
+
+    def append(self, raw):
+        """Append a raw CSV cell; raises ValueError if it is not a number."""
+        if is_nan(raw):
+            self.values.append(0.0)
+            self.missing.append(1)
+            return
+        number = float(raw)
+        self.values.append(number)
+        self.missing.append(0)
+        self.keep_text(len(self.values) - 1, number, raw)
+
+    def is_missing(self, row):
+        """Check if the value at a row is missing."""
+        return bool(self.missing[row])
+
+    def get(self, row):
+        """Return the value at a row as a float, or None if missing."""
+        return None if self.missing[row] else self.values[row]
+
+    def set(self, row, value):
+        """Store a number (or None for missing) at a row."""
+        self.text.pop(row, None)
+        if value is None or is_nan(value):
+            self.values[row] = 0.0
+            self.missing[row] = 1
+            return
+        number = float(value)
+        self.values[row] = number
+        self.missing[row] = 0
+        self.keep_text(row, number, str(value))
+
+    def format(self, row):
+        """Return the CSV text for a row, empty if missing."""
+        if self.missing[row]:
+            return ""
+        text = self.text.get(row)
+        return text if text is not None else self.canonical(self.values[row])
+
+class StringColumn:
+    """Column of strings stored as integer codes into a table of interned values."""
+
+    def __init__(self):
+        # Code per row, -1 for missing
+        self.codes = array('i')
+        # Distinct values by code, and the reverse lookup
+        self.categories = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def code_of(self, value):
+        """Return the code for a value, interning it if new; missing values get -1."""
+        if is_nan(value):
+            return -1
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def append(self, raw):
+        """Append a raw CSV cell."""
+        self.codes.append(self.code_of(raw))
+
+    def is_missing(self, row):
+        """Check if the value at a row is missing."""
+        return self.codes[row] < 0
+
+    def get(self, row):
+        """Return the value at a row, or None if missing."""
+        code = self.codes[row]
+        return None if code < 0 else self.categories[code]
+
+    def set(self, row, value):
+        """Store a value (or None for missing) at a row."""
+        self.codes[row] = self.code_of(value)
+
+    def format(self, row):
+        """Return the CSV text for a row, empty if missing."""
+        code = self.codes[row]
+        return "" if code < 0 else str(self.categories[code])
+
+    def map_values(self, func):
+        """Apply func once per distinct value and recode every row with the results."""
+        old_categories = self.categories
+        self.categories, self.index = [], {}
+        recode = array('i', (self.code_of(func(value)) for value in old_categories))
+        self.codes = array('i', (code if code < 0 else recode[code] for code in self.codes))
+
+    def map_array(self, func):
+        """Apply func to all distinct values at once as a NumPy string array, then recode every row in one step."""
+        old_categories = self.categories
+        self.categories, self.index = [], {}
+        results = func(np.array(old_categories, dtype=str)) if old_categories else []
+        # The trailing -1 sends missing rows (code -1) to missing
+        recode = np.array([self.code_of(value) for value in results] + [-1], dtype=np.int32)
+        self.codes = array('i', recode[np.frombuffer(self.codes, dtype=np.int32)].tobytes())
+
+    @classmethod
+    def empty(cls, num_rows):
+        """Make a column of num_rows missing values."""
+        column = cls()
+        column.codes = array('i', [-1]) * num_rows
+        return column
+
+    @classmethod
+    def from_numeric(cls, column):
+        """Rebuild a numeric column as strings, keeping each value's exact text."""
+        converted = cls()
+        for row in range(len(column)):
+            converted.append(column.format(row))
+        return converted
+
+class ColumnStore:
+    """Table held column by column, with numeric columns inferred on load."""
+
+    def __init__(self, fieldnames, columns):
+        self.fieldnames = list(fieldnames)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[self.fieldnames[0]]) if self.fieldnames else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_records(cls, fieldnames, records):
+        """Build a table from CSV records; a column is numeric unless a value fails to parse."""
+        columns = [NumericColumn() for _ in fieldnames]
+        for record in records:
+            # Blank lines are skipped, and short rows padded with missing values, like csv.DictReader does
+            if not record:
+                continue
+            if len(record) < len(fieldnames):
+                record += [""] * (len(fieldnames) - len(record))
+            for position, raw in enumerate(record[:len(fieldnames)]):
+                column = columns[position]
+                try:
+                    column.append(raw)
+                except ValueError:
+                    # First non-numeric value: switch the column to strings for good
+                    column = columns[position] = StringColumn.from_numeric(column)
+                    column.append(raw)
+        return cls(fieldnames, dict(zip(fieldnames, columns)))
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """Load a CSV file, parsing each cell once."""
+        with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            return cls.from_records(next(reader), reader)
+
+    def as_strings(self, name):
+        """Return a column as a StringColumn, converting it in place if it was parsed as numbers."""
+        column = self.columns[name]
+        if not isinstance(column, StringColumn):
+            column = self.columns[name] = StringColumn.from_numeric(column)
+        return column
+
+    def add_column(self, name, column):
+        """Add a column after the existing ones."""
+        self.fieldnames.append(name)
+        self.columns[name] = column
+
+    def write_rows(self, writer):
+        """Write every row to a csv writer, missing values as empty strings."""
+        columns = [self.columns[name] for name in self.fieldnames]
+        for row in range(len(self)):
+            writer.writerow([column.format(row) for column in columns])
+
+    def to_csv(self, file_path):
+        """Save the table to a CSV file with the same format as save_csv."""
+        with open(file_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(self.fieldnames)
+            self.write_rows(writer)
+
+def read_header(file_path):
+    """Return the column names of a CSV file."""
+    with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+        return next(csv.reader(file))
+
+def iter_csv(file_path, batch_size=STREAM_BATCH_SIZE):
+    """Yield a CSV file as ColumnStore batches of at most batch_size rows, holding one batch at a time."""
+    with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        fieldnames = next(reader)
+        while True:
+            records = list(islice(reader, batch_size))
+            if not records:
+                return
+            yield ColumnStore.from_records(fieldnames, records)
+
+def byte_ranges(file_path, num_chunks):
+    """Split the rows of a CSV file into about num_chunks (start, end) byte ranges that begin at line starts.
+
+    Assumes no quoted field spans lines, so every line start is a record start."""
+    with open(file_path, mode='rb') as file:
+        file.readline()  # Skip the header
+        data_start = file.tell()
+        size = os.fstat(file.fileno()).st_size
+        boundaries = [data_start]
+        for chunk in range(1, num_chunks):
+            file.seek(max(data_start + (size - data_start) * chunk // num_chunks, boundaries[-1]))
+            file.readline()  # Move to the start of the next line
+            boundaries.append(min(file.tell(), size))
+        boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def iter_range(file_path, fieldnames, start, end, batch_size=STREAM_BATCH_SIZE):
+    """Yield the rows in a byte range of a CSV file as ColumnStore batches."""
+    with open(file_path, mode='rb') as file:
+        file.seek(start)
+        position = start
+        lines = []
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            lines.append(line.decode('utf-8'))
+            if len(lines) == batch_size:
+                yield ColumnStore.from_records(fieldnames, csv.reader(lines))
+                lines = []
+        if lines:
+            yield ColumnStore.from_records(fieldnames, csv.reader(lines))
+
+# ------------------------------------------------------------
+# Imputation Rules
+# ------------------------------------------------------------
+
+class Bucket:
+    """Group key computed from the text of another column, e.g. a level band; rows missing that column get no key."""
+
+    def __init__(self, column, func):
+        self.column = column
+        self.func = func
+
+    def key_of(self, store):
+        """Return a row -> key function for this bucket."""
+        column = store[self.column]
+        return lambda row: None if column.is_missing(row) else self.func(column.format(row))
+
+def group_key(store, by):
+    """Return a row -> group key function for a column name or Bucket; missing values give None.
+
+    Keys are cell text rather than codes, so aggregates from different batches or processes line up."""
+    if isinstance(by, Bucket):
+        return by.key_of(store)
+    column = store[by]
+    return lambda row: None if column.is_missing(row) else column.format(row)
+
+def reads_of(by):
+    """Return the column a group key is computed from."""
+    return by.column if isinstance(by, Bucket) else by
+
+def callable_signature(func):
+    """Describe a function for a rule signature: its own signature() if it has one, else its qualified name."""
+    if func is None:
+        return None
+    if hasattr(func, 'signature'):
+        return func.signature()
+    return getattr(func, '__qualname__', type(func).__qualname__)
+
+def key_signature(by):
+    """Describe a column name or Bucket group key for a rule signature."""
+    return ['Bucket', by.column, callable_signature(by.func)] if isinstance(by, Bucket) else by
+
+class Rule:
+    """Base for rules acting on one column; `bind` attaches a rule to the store being scanned."""
+
+    # Attributes tied to the bound store, dropped when a rule is sent to another process
+    bound_attributes = ('values', 'key_of')
+    # Whether the rule fills a whole batch at once with fill_batch(store) instead of row by row with fill(row)
+    fills_in_batches = False
+
+    def __init__(self, column):
+        self.column = column
+
+    def reads(self):
+        return {self.column}
+
+    def writes(self):
+        return {self.column}
+
+    def adds(self):
+        """Columns the rule appends to the table."""
+        return []
+
+    def signature(self):
+        """JSON-able description of what the rule aggregates, to tell whether saved aggregates came from it."""
+        return [type(self).__name__, self.column]
+
+    def __getstate__(self):
+        return {name: value for name, value in self.__dict__.items() if name not in self.bound_attributes}
+
+class Transform(Rule):
+    """Replace every non-missing value of a column with func(value), where value is the cell's text."""
+
+    def __init__(self, column, func):
+        super().__init__(column)
+        self.func = func
+
+    def apply(self, store):
+        """Transform the whole column as text, once per distinct value."""
+        # func works on the raw text, so a column that happened to parse as numbers is turned back into strings
+        store.as_strings(self.column).map_values(self.func)
+
+class VectorTransform(Transform):
+    """Transform whose func takes a NumPy array of distinct values and returns the transformed values in order.
+
+    Results are memoized across calls, so streamed batches only transform values not seen before."""
+
+    def __init__(self, column, func):
+        super().__init__(column, func)
+        self.memo = {}
+
+    def transform_new(self, values):
+        """Look values up in the memo, transforming the unseen ones together."""
+        unseen = [value for value in values if value not in self.memo]
+        if unseen:
+            self.memo.update(zip(unseen, (str(result) for result in self.func(np.array(unseen, dtype=str)))))
+        return [self.memo[value] for value in values]
+
+    def apply(self, store):
+        """Transform the whole column as text, in one vectorized call per batch."""
+        store.as_strings(self.column).map_array(self.transform_new)
+
+class GroupFill(Rule):
+    """Base for rules that fill missing values from an aggregate over a group of rows."""
+
+    def __init__(self, column, by):
+        super().__init__(column)
+        self.by = by
+
+    def reads(self):
+        return {self.column, reads_of(self.by)}
+
+    def signature(self):
+        return super().signature() + [key_signature(self.by)]
+
+    def bind(self, store):
+        """Point the rule at the store (or batch) being scanned."""
+        self.values = store[self.column]
+        self.key_of = group_key(store, self.by)
+
+    def fill(self, row):
+        """Fill the row if its value is missing and it belongs to a group."""
+        if self.values.is_missing(row):
+            key = self.key_of(row)
+            if key is not None:
+                self.values.set(row, self.fill_value(key))
+
+class GroupMeanFill(GroupFill):
+    """Fill missing values with the group's mean rounded to `decimals`, or 0 if the group has no values.
+
+    Sums are kept exact, so means do not depend on row order and agree with sum() / len() up to its rounding."""
+
+    def __init__(self, column, by, decimals=0):
+        super().__init__(column, by)
+        self.decimals = decimals
+
+    def signature(self):
+        return super().signature() + [self.decimals]
+
+    def start(self):
+        """Reset the running aggregates."""
+        # Per group: [sum partials, count] of present values
+        self.sums = {}
+
+    def observe(self, row):
+        """Add one row to its group's running sum and count."""
+        key = self.key_of(row)
+        if key is None:
+            return
+        sums = self.sums.get(key)
+        if sums is None:
+            sums = self.sums[key] = [[], 0]
+        value = self.values.get(row)
+        if value is not None:
+            add_partial(sums[0], float(value))
+            sums[1] += 1
+
+    def export(self):
+        """Return the running aggregates as [key, sum partials, count] lists, for merging or saving as JSON."""
+        return [[key, list(partials), count] for key, (partials, count) in self.sums.items()]
+
+    def merge(self, sums):
+        """Add aggregates exported by another copy of the rule; the partials keep the merged sum exact."""
+        for key, partials, count in sums:
+            mine = self.sums.setdefault(key, [[], 0])
+            # State files saved before sums were exact hold a single float
+            for partial in partials if isinstance(partials, list) else [partials]:
+                add_partial(mine[0], partial)
+            mine[1] += count
+
+    def finish(self):
+        """Turn the running sums into fill values."""
+        self.fill_values = {key: round_value(math.fsum(partials) / count, self.decimals) if count else 0
+                            for key, (partials, count) in self.sums.items()}
+
+    def fill_value(self, key):
+        return self.fill_values[key]
+
+class SpaceSaving:
+    """Mergeable heavy-hitter counts over at most `capacity` distinct values (the space-saving sketch).
+
+    Counts are exact until a value has to be evicted. After that the sketch is always full, and each kept count
+    overestimates the true one by at most its error, which is never more than the smallest kept count.
+
+    Once full, the sketch keeps a min-heap of (count, insertion number, value) so each eviction costs O(log capacity)
+    instead of a scan. Entries go stale when a count grows and are skipped when popped; the heap is rebuilt when stale
+    entries outnumber live ones. The least counted value is evicted, the earliest inserted one on ties."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.exact = True
+        # Eviction heap and each held value's insertion number, None until the sketch first fills up
+        self.heap = None
+        self.inserted = None
+        self.next_number = 0
+
+    def build_heap(self):
+        """Index the held values by count, numbering them in insertion order."""
+        self.inserted = {value: number for number, value in enumerate(self.counts, self.next_number)}
+        self.next_number += len(self.counts)
+        self.heap = [(count, self.inserted[value], value) for value, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def evict(self):
+        """Remove the least counted value (the earliest inserted on ties) and return its count."""
+        while True:
+            count, number, value = heapq.heappop(self.heap)
+            if self.inserted.get(value) == number and self.counts[value] == count:
+                break
+        del self.counts[value], self.errors[value], self.inserted[value]
+        return count
+
+    def add(self, value, count=1):
+        """Count a value, evicting the least counted one if the sketch is full."""
+        if value in self.counts:
+            self.counts[value] += count
+            if self.heap is not None:
+                heapq.heappush(self.heap, (self.counts[value], self.inserted[value], value))
+                if len(self.heap) > 4 * self.capacity:
+                    self.build_heap()
+            return
+        floor = 0
+        if len(self.counts) >= self.capacity:
+            if self.heap is None:
+                self.build_heap()
+            floor = self.evict()
+            self.exact = False
+        self.counts[value] = floor + count
+        self.errors[value] = floor
+        if self.heap is not None:
+            self.inserted[value] = self.next_number
+            heapq.heappush(self.heap, (self.counts[value], self.next_number, value))
+            self.next_number += 1
+
+    def floor(self):
+        """Upper bound on the count of a value the sketch does not hold."""
+        return 0 if self.exact else min(self.counts.values())
+
+    def export(self):
+        """Return the sketch as [exact, [[value, count, error], ...]], for merging or saving as JSON."""
+        return [self.exact, [[value, count, self.errors[value]] for value, count in self.counts.items()]]
+
+    def merge(self, exported):
+        """Add a sketch exported by export(), keeping the `capacity` largest combined counts."""
+        exact, entries = exported
+        other_counts = {value: count for value, count, _ in entries}
+        other_errors = {value: error for value, _, error in entries}
+        own_floor = self.floor()
+        other_floor = 0 if exact else min(other_counts.values())
+        counts = {}
+        errors = {}
+        for value in {**self.counts, **other_counts}:
+            counts[value] = self.counts.get(value, own_floor) + other_counts.get(value, other_floor)
+            errors[value] = self.errors.get(value, own_floor) + other_errors.get(value, other_floor)
+        self.exact = self.exact and exact and len(counts) <= self.capacity
+        if len(counts) > self.capacity:
+            kept = sorted(counts, key=lambda value: (-counts[value], value))[:self.capacity]
+            counts = {value: counts[value] for value in kept}
+        self.counts = counts
+        self.errors = {value: errors[value] for value in counts}
+        # Rebuilt from the merged counts when next needed
+        self.heap = self.inserted = None
+
+class GroupModeFill(GroupFill):
+    """Fill missing values with the group's most common value (first alphabetically on ties), or '' if none.
+
+    With `split`, each value is split into parts and the parts are counted instead; with `decode` as well, split may
+    return ids that decode maps back to values, so counting works on ids. With `max_counters`, each group
+    counts its values in a SpaceSaving sketch of that size instead of exactly; groups with no more distinct values
+    than that stay exact, and fills taken from an approximate group are marked 'yes' in an added
+    `<column>_approximate` column."""
+
+    bound_attributes = GroupFill.bound_attributes + ('marks',)
+
+    def __init__(self, column, by, split=None, max_counters=None, decode=None):
+        super().__init__(column, by)
+        self.split = split
+        self.decode = decode
+        self.max_counters = max_counters
+        self.marker = f'{column}_approximate' if max_counters else None
+
+    def writes(self):
+        return {self.column, *self.adds()}
+
+    def adds(self):
+        return [self.marker] if self.marker else []
+
+    def signature(self):
+        return super().signature() + [self.max_counters, callable_signature(self.split),
+                                      callable_signature(self.decode)]
+
+    def bind(self, store):
+        # Fills are text, so a batch where the column was all missing (and parsed as numbers) switches to strings
+        store.as_strings(self.column)
+        super().bind(store)
+        if self.marker:
+            if self.marker not in store.columns:
+                store.add_column(self.marker, StringColumn.empty(len(store)))
+            self.marks = store[self.marker]
+
+    def start(self):
+        """Reset the running aggregates."""
+        # Count (group, value) pairs, or in approximate mode keep a sketch per group
+        self.pair_counts = defaultdict(int)
+        self.sketches = {}
+
+    def observe(self, row):
+        """Count the row's value within its group."""
+        if self.values.is_missing(row):
+            return
+        key = self.key_of(row)
+        if key is None:
+            return
+        if not self.max_counters:
+            self.pair_counts[key, self.values.format(row)] += 1
+            return
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = SpaceSaving(self.max_counters)
+        value = self.values.format(row)
+        for part in self.split(value) if self.split else [value]:
+            # Ids need not agree between processes, so sketches count decoded values
+            if self.decode:
+                part = self.decode(part)
+            if not is_nan(part):
+                sketch.add(part)
+
+    def export(self):
+        """Return the running aggregates as [key, value, count] lists (or [key, sketch] lists), for merging or
+        saving as JSON."""
+        if self.max_counters:
+            return [[key, sketch.export()] for key, sketch in self.sketches.items()]
+        return [[key, value, count] for (key, value), count in self.pair_counts.items()]
+
+    def merge(self, aggregates):
+        """Add aggregates exported by another copy of the rule."""
+        if self.max_counters:
+            for key, exported in aggregates:
+                if key not in self.sketches:
+                    self.sketches[key] = SpaceSaving(self.max_counters)
+                self.sketches[key].merge(exported)
+            return
+        for key, value, count in aggregates:
+            self.pair_counts[key, value] += count
+
+    def finish(self):
+        """Pick each group's most common value, splitting each distinct value at most once."""
+        if self.max_counters:
+            self.fill_values = {key: most_common_of_counts(sketch.counts) for key, sketch in self.sketches.items()}
+            self.approximate_keys = {key for key, sketch in self.sketches.items() if not sketch.exact}
+            return
+        frequency = defaultdict(lambda: defaultdict(int))
+        parts_of = {}
+        for (key, value), count in self.pair_counts.items():
+            if value not in parts_of:
+                parts_of[value] = self.split(value) if self.split else [value]
+            for part in parts_of[value]:
+                if not is_nan(part):
+                    frequency[key][part] += count
+        if self.decode:
+            frequency = {key: {self.decode(part): count for part, count in counts.items()}
+                         for key, counts in frequency.items()}
+        self.fill_values = {key: most_common_of_counts(counts) for key, counts in frequency.items()}
+        self.approximate_keys = set()
+
+    def fill_value(self, key):
+        return self.fill_values.get(key, '')
+
+    def fill(self, row):
+        """Fill the row like GroupFill, marking it if the fill came from an approximate count."""
+        if self.values.is_missing(row):
+            key = self.key_of(row)
+            if key is not None:
+                self.values.set(row, self.fill_value(key))
+                if key in self.approximate_keys:
+                    self.marks.set(row, 'yes')
+
+# ------------------------------------------------------------
+# Spatial Imputation
+# ------------------------------------------------------------
+
+class KDTree:
+    """Exact nearest-neighbour index over a fixed set of points, queried in vectorized batches.
+
+    Points are split at the median of their widest dimension down to leaves of at most leaf_size points. A batch of
+    queries first scans its home leaves for a tight bound, then walks the tree together, each node keeping only the
+    queries whose best distance so far exceeds their distance to the node's bounding box."""
+
+    def __init__(self, points, leaf_size=16):
+        self.points = np.asarray(points, dtype=np.float64)
+        # Per node: split dimension and value, children, bounding box, and leaf number (-1 for internal nodes)
+        self.dims, self.splits, self.children, self.lower, self.upper, self.leaf_of = [], [], [], [], [], []
+        # Per leaf: point indices
+        self.leaves = []
+        if len(self.points):
+            self.build(np.arange(len(self.points)), leaf_size)
+        self.dims = np.array(self.dims, dtype=np.int64)
+        self.splits = np.array(self.splits)
+        self.children = np.array(self.children, dtype=np.int64).reshape(-1, 2)
+        self.leaf_of = np.array(self.leaf_of, dtype=np.int64)
+
+    def build(self, indices, leaf_size):
+        """Add the subtree over the given point indices and return its node number."""
+        node = len(self.dims)
+        points = self.points[indices]
+        self.dims.append(-1)
+        self.splits.append(0.0)
+        self.children.append([-1, -1])
+        self.lower.append(points.min(axis=0))
+        self.upper.append(points.max(axis=0))
+        self.leaf_of.append(-1)
+        if len(indices) <= leaf_size:
+            self.leaf_of[node] = len(self.leaves)
+            self.leaves.append(indices)
+            return node
+        dim = int(np.argmax(self.upper[node] - self.lower[node]))
+        order = np.argsort(points[:, dim], kind='stable')
+        middle = len(indices) // 2
+        self.dims[node] = dim
+        self.splits[node] = points[order[middle - 1], dim]
+        self.children[node] = [self.build(indices[order[:middle]], leaf_size),
+                               self.build(indices[order[middle:]], leaf_size)]
+        return node
+
+    def query(self, queries, batch_size=STREAM_BATCH_SIZE):
+        """Return the index of the nearest point to each query; ties go to the lower index."""
+        queries = np.asarray(queries, dtype=np.float64)
+        nearest = np.empty(len(queries), dtype=np.int64)
+        for start in range(0, len(queries), batch_size):
+            nearest[start:start + batch_size] = self.query_batch(queries[start:start + batch_size])
+        return nearest
+
+    def query_batch(self, queries):
+        """Nearest point indices for one batch of queries."""
+        best = np.full(len(queries), np.inf)
+        best_index = np.full(len(queries), len(self.points), dtype=np.int64)
+        if not len(queries) or not len(self.points):
+            return best_index
+        # Descend every query to its home leaf, one tree level at a time
+        nodes = np.zeros(len(queries), dtype=np.int64)
+        while True:
+            internal = np.flatnonzero(self.dims[nodes] >= 0)
+            if not len(internal):
+                break
+            at = nodes[internal]
+            right = queries[internal, self.dims[at]] > self.splits[at]
+            nodes[internal] = self.children[at, right.astype(np.int64)]
+        home = self.leaf_of[nodes]
+        # Home leaves first, with the queries grouped by leaf
+        order = np.argsort(home, kind='stable')
+        bounds = np.searchsorted(home[order], np.arange(len(self.leaves) + 1))
+        for leaf in range(len(self.leaves)):
+            self.scan_leaf(leaf, queries, order[bounds[leaf]:bounds[leaf + 1]], best, best_index)
+        # Then every other leaf that could still hold a nearer point
+        stack = [(0, np.arange(len(queries)))]
+        while stack:
+            node, rows = stack.pop()
+            gap = (np.maximum(self.lower[node] - queries[rows], 0)
+                   + np.maximum(queries[rows] - self.upper[node], 0))
+            rows = rows[(gap * gap).sum(axis=1) <= best[rows]]
+            if not len(rows):
+                continue
+            leaf = self.leaf_of[node]
+            if leaf >= 0:
+                self.scan_leaf(leaf, queries, rows[home[rows] != leaf], best, best_index)
+            else:
+                stack.extend((child, rows) for child in self.children[node])
+        return best_index
+
+    def scan_leaf(self, leaf, queries, rows, best, best_index):
+        """Update best distances and indices of the given queries with the points of one leaf."""
+        if not len(rows):
+            return
+        indices = self.leaves[leaf]
+        difference = queries[rows, None, :] - self.points[indices][None, :, :]
+        distances = (difference * difference).sum(axis=2)
+        # Lowest index among the leaf's nearest points, per query
+        closest = distances.min(axis=1)
+        candidate = np.where(distances == closest[:, None], indices[None, :], len(self.points)).min(axis=1)
+        better = (closest < best[rows]) | ((closest == best[rows]) & (candidate < best_index[rows]))
+        best[rows[better]] = closest[better]
+        best_index[rows[better]] = candidate[better]
+
+def numeric_values(column):
+    """Return a column's values as a float array and a mask of the rows that have one."""
+    if isinstance(column, NumericColumn):
+        return (np.frombuffer(column.values, dtype=np.float64),
+                np.frombuffer(column.missing, dtype=np.uint8) == 0)
+    values = [column.get(row) for row in range(len(column))]
+    present = np.array([value is not None for value in values], dtype=bool)
+    return np.array([float(value) if value is not None else 0.0 for value in values]), present
+
+def unit_vectors(latitudes, longitudes):
+    """Map degrees of latitude and longitude to points on the unit sphere, where straight-line distance ranks
+    places the same way as great-circle distance."""
+    latitudes = np.radians(latitudes)
+    longitudes = np.radians(longitudes)
+    return np.column_stack([np.cos(latitudes) * np.cos(longitudes), np.cos(latitudes) * np.sin(longitudes),
+                            np.sin(latitudes)])
+
+class NearestGroupFill(Rule):
+    """Fill a missing group label (e.g. province) with the group whose mean position is nearest to the row's.
+
+    Group centroids are the mean latitude and longitude of the labelled rows, and missing labels are resolved in
+    one vectorized KD-tree query per batch. Rows missing either coordinate are left alone."""
+
+    bound_attributes = ('values', 'latitudes', 'longitudes')
+    fills_in_batches = True
+
+    def __init__(self, column, latitude, longitude):
+        super().__init__(column)
+        self.latitude = latitude
+        self.longitude = longitude
+
+    def reads(self):
+        return {self.column, self.latitude, self.longitude}
+
+    def bind(self, store):
+        """Point the rule at the store (or batch) being scanned."""
+        # Labels are text, even in a batch where every label is missing
+        self.values = store.as_strings(self.column)
+        self.latitudes = store[self.latitude]
+        self.longitudes = store[self.longitude]
+
+    def start(self):
+        """Reset the running aggregates."""
+        # Per group: [latitude sum, longitude sum, count] over rows with both coordinates
+        self.sums = {}
+
+    def position(self, row):
+        """Return a row's (latitude, longitude), or None if either is missing."""
+        latitude, longitude = self.latitudes.get(row), self.longitudes.get(row)
+        if latitude is None or longitude is None:
+            return None
+        return float(latitude), float(longitude)
+
+    def observe(self, row):
+        """Add a labelled row's position to its group's running sums."""
+        if self.values.is_missing(row):
+            return
+        position = self.position(row)
+        if position is None:
+            return
+        sums = self.sums.setdefault(self.values.format(row), [0.0, 0.0, 0])
+        sums[0] += position[0]
+        sums[1] += position[1]
+        sums[2] += 1
+
+    def export(self):
+        """Return the running aggregates as [key, latitude sum, longitude sum, count] lists."""
+        return [[key, *sums] for key, sums in self.sums.items()]
+
+    def merge(self, sums):
+        """Add aggregates exported by another copy of the rule."""
+        for key, latitude_sum, longitude_sum, count in sums:
+            mine = self.sums.setdefault(key, [0.0, 0.0, 0])
+            mine[0] += latitude_sum
+            mine[1] += longitude_sum
+            mine[2] += count
+
+    def finish(self):
+        """Index the group centroids, in key order so the result does not depend on row order."""
+        self.keys = sorted(self.sums)
+        centroids = np.array([[self.sums[key][0] / self.sums[key][2], self.sums[key][1] / self.sums[key][2]]
+                              for key in self.keys]).reshape(-1, 2)
+        self.tree = KDTree(unit_vectors(centroids[:, 0], centroids[:, 1]))
+
+    def fill_batch(self, store):
+        """Label every unlabelled row that has a position with its nearest group."""
+        if not self.keys:
+            return
+        latitudes, has_latitude = numeric_values(self.latitudes)
+        longitudes, has_longitude = numeric_values(self.longitudes)
+        codes = np.frombuffer(self.values.codes, dtype=np.int32)
+        rows = np.flatnonzero((codes < 0) & has_latitude & has_longitude)
+        if not len(rows):
+            return
+        nearest = self.tree.query(unit_vectors(latitudes[rows], longitudes[rows]))
+        key_codes = np.array([self.values.code_of(key) for key in self.keys], dtype=np.int32)
+        filled = codes.copy()
+        filled[rows] = key_codes[nearest]
+        self.values.codes = array('i', filled.tobytes())
+
+def observe_range(file_path, fieldnames, start, end, fills, batch_size):
+    """Worker pass one: aggregate a byte range and return each rule's partial aggregates."""
+    for rule in fills:
+        rule.start()
+    for batch in iter_range(file_path, fieldnames, start, end, batch_size):
+        Pipeline.observe(fills, batch)
+    return [rule.export() for rule in fills]
+
+def apply_range(file_path, fieldnames, start, end, rules, batch_size, part_path):
+    """Worker pass two: transform and fill a byte range, writing its rows (no header) to part_path."""
+    fills = [rule for rule in rules if not isinstance(rule, Transform)]
+    with open(part_path, mode='w', newline='', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as file:
+        writer = csv.writer(file)
+        for batch in iter_range(file_path, fieldnames, start, end, batch_size):
+            Pipeline.apply(rules, fills, batch)
+            batch.write_rows(writer)
+
+class Pipeline:
+    """Ordered imputation rules, planned into stages that each cost one read pass and one write pass."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    def plan(self):
+        """Group rules into stages; a rule waits for any earlier rule it shares a column with in a conflicting way."""
+        stage_of = []
+        for position, rule in enumerate(self.rules):
+            stage = 0
+            for earlier in range(position):
+                other = self.rules[earlier]
+                # Read after write, or write after read, forces a later stage
+                if other.writes() & rule.reads() or rule.writes() & other.reads():
+                    stage = max(stage, stage_of[earlier] + 1)
+            stage_of.append(stage)
+        stages = [[] for _ in range(max(stage_of, default=-1) + 1)]
+        for rule, stage in zip(self.rules, stage_of):
+            stages[stage].append(rule)
+        return stages
+
+    @staticmethod
+    def output_fieldnames(rules, fieldnames):
+        """Header of a stage's output: the input columns, then any columns the rules add."""
+        added = [name for rule in rules for name in rule.adds() if name not in fieldnames]
+        return list(fieldnames) + added
+
+    @staticmethod
+    def observe(fills, store):
+        """Read pass: feed every aggregation from a single scan of the store."""
+        for rule in fills:
+            rule.bind(store)
+        for row in range(len(store)):
+            for rule in fills:
+                rule.observe(row)
+
+    @staticmethod
+    def apply(rules, fills, store):
+        """Write pass: transforms, then every fill in a single scan of the store."""
+        for rule in rules:
+            if isinstance(rule, Transform):
+                rule.apply(store)
+        for rule in fills:
+            rule.bind(store)
+        row_fills = [rule for rule in fills if not rule.fills_in_batches]
+        for row in range(len(store)):
+            for rule in row_fills:
+                rule.fill(row)
+        for rule in fills:
+            if rule.fills_in_batches:
+                rule.fill_batch(store)
+
+    def run(self, store):
+        """Apply every rule to the store in place."""
+        for rules in self.plan():
+            fills = [rule for rule in rules if not isinstance(rule, Transform)]
+            for rule in fills:
+                rule.start()
+            self.observe(fills, store)
+            for rule in fills:
+                rule.finish()
+            self.apply(rules, fills, store)
+
+    def run_files(self, input_path, output_path, run_stage):
+        """Run each stage as run_stage(rules, fills, source, target), chaining stages through temporary files."""
+        stages = self.plan()
+        source = input_path
+        for number, rules in enumerate(stages):
+            fills = [rule for rule in rules if not isinstance(rule, Transform)]
+            if number == len(stages) - 1:
+                target = output_path
+            else:
+                handle, target = tempfile.mkstemp(suffix='.csv', dir=os.path.dirname(os.path.abspath(output_path)))
+                os.close(handle)
+            run_stage(rules, fills, source, target)
+            # Intermediate files of earlier stages are no longer needed
+            if source != input_path:
+                os.remove(source)
+            source = target
+
+    def run_stream(self, input_path, output_path, batch_size=STREAM_BATCH_SIZE):
+        """Apply every rule to a CSV file too large for memory: two streaming passes per stage.
+
+        Only the per-group aggregates outlive a batch."""
+        def run_stage(rules, fills, source, target):
+            # Pass one: aggregates only
+            for rule in fills:
+                rule.start()
+            for batch in iter_csv(source, batch_size):
+                self.observe(fills, batch)
+            for rule in fills:
+                rule.finish()
+            # Pass two: transforms and fills, written out batch by batch
+            with open(target, mode='w', newline='', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as file:
+                writer = csv.writer(file)
+                writer.writerow(self.output_fieldnames(rules, read_header(source)))
+                for batch in iter_csv(source, batch_size):
+                    self.apply(rules, fills, batch)
+                    batch.write_rows(writer)
+        self.run_files(input_path, output_path, run_stage)
+
+    def run_parallel(self, input_path, output_path, workers, batch_size=STREAM_BATCH_SIZE):
+        """Apply every rule to a CSV file on a process pool, splitting it into byte ranges.
+
+        Workers return partial aggregates that are merged here, then fill their ranges into part files that are
+        concatenated in order, so the output matches a serial run."""
+        def run_stage(rules, fills, source, target):
+            fieldnames = read_header(source)
+            ranges = byte_ranges(source, workers * 4)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Pass one: partial aggregates per range, merged in range order
+                for rule in fills:
+                    rule.start()
+                partials = pool.map(observe_range, *zip(*[(source, fieldnames, start, end, fills, batch_size)
+                                                          for start, end in ranges]))
+                for exported in partials:
+                    for rule, aggregates in zip(fills, exported):
+                        rule.merge(aggregates)
+                for rule in fills:
+                    rule.finish()
+                # Pass two: each range is filled into its own part file
+                part_paths = [f'{target}.part{number}' for number in range(len(ranges))]
+                list(pool.map(apply_range, *zip(*[(source, fieldnames, start, end, rules, batch_size, part_path)
+                                                  for (start, end), part_path in zip(ranges, part_paths)])))
+            # Stitch the parts together behind the header
+            with open(target, mode='w', newline='', encoding='utf-8') as file:
+                csv.writer(file).writerow(self.output_fieldnames(rules, fieldnames))
+            with open(target, mode='ab') as file:
+                for part_path in part_paths:
+                    with open(part_path, mode='rb') as part:
+                        shutil.copyfileobj(part, file, OUTPUT_BUFFER_SIZE)
+                    os.remove(part_path)
+        self.run_files(input_path, output_path, run_stage)
+
+    def append(self, input_path, output_path, state, batch_size=STREAM_BATCH_SIZE):
+        """Clean the rows of input_path against the saved aggregates in state and append them to output_path.
+
+        Aggregates are updated with the new rows first, so new rows are filled as a full rerun would fill them.
+        Returns (row, column, group key, imputed value, current value) for every earlier imputation whose group's
+        fill value has since changed, ordered by row."""
+        stages = self.plan()
+        if len(stages) > 1:
+            raise ValueError("append needs rules that run in a single stage")
+        rules = stages[0] if stages else []
+        fills = [rule for rule in rules if not isinstance(rule, Transform)]
+        if any(rule.fills_in_batches for rule in fills):
+            raise ValueError("append cannot log imputations of rules that fill whole batches")
+        fieldnames = read_header(input_path)
+        signatures = [rule.signature() for rule in fills]
+        if state.fieldnames is None:
+            state.fieldnames = fieldnames
+            state.rules = signatures
+            state.aggregates = [[] for _ in fills]
+            state.imputations = [{} for _ in fills]
+        elif state.fieldnames != fieldnames or state.rules != signatures:
+            raise ValueError(f"{state.file_location} was saved for other columns or rules")
+
+        # Pass one: saved aggregates plus the new rows
+        for rule, aggregates in zip(fills, state.aggregates):
+            rule.start()
+            rule.merge(aggregates)
+        for batch in iter_csv(input_path, batch_size):
+            self.observe(fills, batch)
+        for rule in fills:
+            rule.finish()
+
+        # Pass two: log which rows get imputed with what, then transform, fill and append
+        with open(output_path, mode='a' if state.num_rows else 'w', newline='', encoding='utf-8',
+                  buffering=OUTPUT_BUFFER_SIZE) as file:
+            writer = csv.writer(file)
+            if not state.num_rows:
+                writer.writerow(self.output_fieldnames(rules, fieldnames))
+            for batch in iter_csv(input_path, batch_size):
+                for rule, log in zip(fills, state.imputations):
+                    rule.bind(batch)
+                    for row in range(len(batch)):
+                        if rule.values.is_missing(row):
+                            key = rule.key_of(row)
+                            if key is not None:
+                                log.setdefault((key, rule.fill_value(key)), []).append(state.num_rows + row)
+                self.apply(rules, fills, batch)
+                batch.write_rows(writer)
+                state.num_rows += len(batch)
+        state.aggregates = [rule.export() for rule in fills]
+
+        # Earlier imputations are stale where the group's fill value moved
+        stale = []
+        for rule, log in zip(fills, state.imputations):
+            for (key, imputed), rows in log.items():
+                current = rule.fill_value(key)
+                if current != imputed:
+                    stale.extend((row, rule.column, key, imputed, current) for row in rows)
+        return sorted(stale, key=lambda entry: entry[:2])
+
+class ImputationState:
+    """Aggregates and imputation log saved between appends, so earlier rows never have to be reread."""
+
+    def __init__(self, file_location):
+        # Where the state lives on disk
+        self.file_location = file_location
+        # Header of the cleaned file, None until the first append
+        self.fieldnames = None
+        # Rows written to the cleaned file so far
+        self.num_rows = 0
+        # Per fill rule: its signature, so aggregates are only merged into the rules that produced them
+        self.rules = None
+        # Per fill rule: its exported aggregates
+        self.aggregates = []
+        # Per fill rule: (group key, imputed value) -> rows imputed with that value
+        self.imputations = []
+
+    @classmethod
+    def load(cls, file_location):
+        """Load the state from disk, starting empty if there is none."""
+        state = cls(file_location)
+        if not os.path.exists(file_location):
+            return state
+        with open(file_location, mode='r', encoding='utf-8') as file:
+            saved = json.load(file)
+        state.fieldnames = saved['fieldnames']
+        state.num_rows = saved['num_rows']
+        state.rules = saved.get('rules')
+        state.aggregates = saved['aggregates']
+        state.imputations = [{(key, imputed): rows for key, imputed, rows in log} for log in saved['imputations']]
+        return state
+
+    def save(self):
+        """Write the state to disk, replacing the old copy atomically."""
+        saved = {
+            'fieldnames': self.fieldnames,
+            'num_rows': self.num_rows,
+            'rules': self.rules,
+            'aggregates': self.aggregates,
+            'imputations': [[[key, imputed, rows] for (key, imputed), rows in log.items()] for log in self.imputations],
+        }
+        temp_location = f'{self.file_location}.tmp'
+        with open(temp_location, mode='w', encoding='utf-8') as file:
+            json.dump(saved, file)
+        os.replace(temp_location, self.file_location)
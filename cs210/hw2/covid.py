@@ -1,119 +1,144 @@
+import argparse
 import csv
-from collections import defaultdict
+import os
 import re
 
-# ------------------------------------------------------------
-# Helper Functions (Shared across all problems)
-# ------------------------------------------------------------
-
-def is_nan(value):
-    """Check if a value is NaN (missing)."""
-    if value is None or value == "":
-        return True
-    if isinstance(value, str):  # Only call lower() if value is a string
-        return value.lower() == "nan"
-    return False  # Numeric values are not NaN in this context
-
-def round_value(value, decimals=0):
-    """Round a value to specified decimal places."""
-    return round(float(value), decimals) if value is not None and not is_nan(value) else None
+import numpy as np
 
-def get_most_common(values):
-    """Find the most common value in a list. In case of a tie, return the first one alphabetically."""
-    frequency = defaultdict(int)
-    for value in values:
-        if not is_nan(value):
-            frequency[value] += 1
-    if not frequency:
-        return None
-    max_freq = max(frequency.values())
-    most_common = [value for value, freq in frequency.items() if freq == max_freq]
-    return sorted(most_common)[0]
-
-def load_csv(file_path):
-    """Load a CSV file into a list of dictionaries."""
-    with open(file_path, mode='r', newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        return list(reader)
-
-def save_csv(data, file_path, fieldnames):
-    """Save a list of dictionaries to a CSV file with the same format as the input."""
-    with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            cleaned_row = {key: "" if is_nan(value) else str(value) for key, value in row.items()}
-            writer.writerow(cleaned_row)
+from cleaning import (STREAM_BATCH_SIZE, ColumnStore, GroupMeanFill, GroupModeFill, ImputationState,
+                      NearestGroupFill, Pipeline, Transform, VectorTransform, round_value)
+from symptoms import SymptomNormalizer
 
 # ------------------------------------------------------------
 # Problem 2: Covid Dataset
 # ------------------------------------------------------------
 
-# Load the dataset
-covid_data = load_csv('covidTrain.csv')
-
 # Task 1: Replace age range with average
-for row in covid_data:
-    if not is_nan(row['age']) and '-' in row['age']:
-        start, end = map(int, row['age'].split('-'))
-        row['age'] = str(round_value((start + end) / 2))
+def age_midpoint(age):
+    """Turn an 'a-b' age range into its rounded midpoint; other ages are kept."""
+    if '-' in age:
+        start, end = map(int, age.split('-'))
+        return str(round_value((start + end) / 2))
+    return age
 
 # Task 2: Change date format
-date_fields = ['date_onset_symptoms', 'date_admission_hospital', 'date_confirmation']
-for row in covid_data:
-    for field in date_fields:
-        if not is_nan(row[field]):
-            day, month, year = row[field].split('.')
-            row[field] = f"{month}.{day}.{year}"
-
-# Task 3: Fill missing latitude and longitude
-# Calculate average latitude and longitude for each province
-province_to_lat_lon = defaultdict(lambda: {'lat': [], 'lon': []})
-for row in covid_data:
-    if not is_nan(row['province']):
-        province_to_lat_lon[row['province']]['lat'].append(float(row['latitude']) if not is_nan(row['latitude']) else None)
-        province_to_lat_lon[row['province']]['lon'].append(float(row['longitude']) if not is_nan(row['longitude']) else None)
-
-# Calculate average latitude and longitude for each province
-province_avg = {}
-for province, data in province_to_lat_lon.items():
-    # Remove None values
-    lat_vals = [x for x in data['lat'] if x is not None]
-    lon_vals = [x for x in data['lon'] if x is not None]
-    # Calculate average
-    province_avg[province] = {
-        'latitude': round_value(sum(lat_vals) / len(lat_vals), 2) if lat_vals else 0,
-        'longitude': round_value(sum(lon_vals) / len(lon_vals), 2) if lon_vals else 0
-    }
-
-for row in covid_data:
-    if not is_nan(row['province']):
-        if is_nan(row['latitude']):
-            row['latitude'] = province_avg[row['province']]['latitude']
-        if is_nan(row['longitude']):
-            row['longitude'] = province_avg[row['province']]['longitude']
+def swap_day_month(date):
+    """Turn a dd.mm.yyyy date into mm.dd.yyyy."""
+    day, month, year = date.split('.')
+    return f"{month}.{day}.{year}"
+
+# Vectorized Tasks 1 and 2, over an array of distinct values at a time
+def age_midpoints(ages):
+    """Array version of age_midpoint; the halves round to even like round_value."""
+    start, dash, end = np.char.partition(ages, '-').T
+    ranges = dash == '-'
+    midpoints = np.round((start[ranges].astype(int) + end[ranges].astype(int)) / 2)
+    result = ages.astype(object)
+    result[ranges] = midpoints.astype(str)
+    return result
+
+def swap_day_months(dates):
+    """Array version of swap_day_month."""
+    malformed = np.char.count(dates, '.') != 2
+    if malformed.any():
+        raise ValueError(f"not a dd.mm.yyyy date: {dates[malformed][0]!r}")
+    day, _, rest = np.char.partition(dates, '.').T
+    month, _, year = np.char.partition(rest, '.').T
+    return np.char.add(np.char.add(np.char.add(month, '.'), np.char.add(day, '.')), year)
+
+# Task 5: Symptoms are counted one by one
+def split_symptoms(symptoms):
+    """Split a symptom list on either separator."""
+    return re.split(r'; |;', symptoms)  # Handle both separators
 
-# Task 4: Fill missing city values
-province_to_city = defaultdict(list)
-for row in covid_data:
-    if not is_nan(row['province']) and not is_nan(row['city']):
-        province_to_city[row['province']].append(row['city'])
-most_common_city = {province: get_most_common(cities) for province, cities in province_to_city.items()}
-for row in covid_data:
-    if is_nan(row['city']) and not is_nan(row['province']):
-        row['city'] = most_common_city.get(row['province'], '')
-
-# Task 5: Fill missing symptom values
-province_to_symptoms = defaultdict(list)
-for row in covid_data:
-    if not is_nan(row['province']) and not is_nan(row['symptoms']):
-        symptoms = re.split(r'; |;', row['symptoms'])  # Handle both separators
-        province_to_symptoms[row['province']].extend(symptoms)
-most_common_symptom = {province: get_most_common(symptoms) for province, symptoms in province_to_symptoms.items()}
-for row in covid_data:
-    if is_nan(row['symptoms']) and not is_nan(row['province']):
-        row['symptoms'] = most_common_symptom.get(row['province'], '')
-
-# Save modified data
-save_csv(covid_data, 'covidResult.csv', fieldnames=covid_data[0].keys())
+date_fields = ['date_onset_symptoms', 'date_admission_hospital', 'date_confirmation']
 
+def covid_rules(vectorized=False, max_counters=None, nearest_province=False, synonyms=None):
+    """The cleaning tasks as pipeline rules; with vectorized, Tasks 1 and 2 run as NumPy array operations.
+
+    With max_counters, Tasks 4 and 5 count each province's values in heavy-hitter sketches of that size. With
+    nearest_province, rows missing a province first get the one whose centroid is nearest, so Tasks 3 to 5 reach them.
+    With a synonyms dictionary file, Task 5 counts canonical symptoms instead of raw strings."""
+    transform = VectorTransform if vectorized else Transform
+    if synonyms:
+        normalizer = SymptomNormalizer.from_csv(synonyms)
+        symptom_parts = {'split': normalizer, 'decode': normalizer.name_of}
+    else:
+        symptom_parts = {'split': split_symptoms}
+    return [
+        # Task 1: Replace age range with average
+        transform('age', age_midpoints if vectorized else age_midpoint),
+        # Task 2: Change date format
+        *(transform(field, swap_day_months if vectorized else swap_day_month) for field in date_fields),
+        # Assign missing provinces from latitude and longitude; the fills below then wait for a second pass
+        *([NearestGroupFill('province', 'latitude', 'longitude')] if nearest_province else []),
+        # Task 3: Fill missing latitude and longitude with the province average
+        GroupMeanFill('latitude', by='province', decimals=2),
+        GroupMeanFill('longitude', by='province', decimals=2),
+        # Task 4: Fill missing city values with the province's most common city
+        GroupModeFill('city', by='province', max_counters=max_counters),
+        # Task 5: Fill missing symptom values with the province's most common symptom
+        GroupModeFill('symptoms', by='province', max_counters=max_counters, **symptom_parts),
+    ]
+
+def append_rows(pipeline, new_rows_location, state_location, stale_location):
+    """Clean new rows onto covidResult.csv using the saved province aggregates, and list stale imputations."""
+    # Without saved state, start from the training data
+    if not os.path.exists(state_location):
+        state = ImputationState(state_location)
+        pipeline.append('covidTrain.csv', 'covidResult.csv', state)
+    else:
+        state = ImputationState.load(state_location)
+    stale = pipeline.append(new_rows_location, 'covidResult.csv', state)
+    state.save()
+    # Earlier rows whose province mean or mode has moved, by data row number in covidResult.csv
+    with open(stale_location, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['row', 'column', 'province', 'imputed', 'current'])
+        writer.writerows(stale)
+    return stale
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean covidTrain.csv into covidResult.csv')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream the file twice instead of loading it, keeping only per-province aggregates')
+    parser.add_argument('--batch-size', type=int, default=STREAM_BATCH_SIZE,
+                        help='rows held in memory at a time with --stream or --workers')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='run the age and date tasks as NumPy array operations')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='clean the file in byte ranges on this many processes, like --stream but in parallel')
+    parser.add_argument('--approximate', type=int, metavar='N',
+                        help='find city and symptom modes with N heavy-hitter counters per province; fills from '
+                             'provinces with more distinct values are marked in city_approximate/symptoms_approximate')
+    parser.add_argument('--nearest-province', action='store_true',
+                        help='give rows missing a province the one with the nearest centroid before the other fills')
+    parser.add_argument('--synonyms', nargs='?', const='symptom_synonyms.csv', metavar='CSV',
+                        help='count canonical symptoms from a synonym,canonical dictionary (default '
+                             'symptom_synonyms.csv) instead of raw symptom strings')
+    parser.add_argument('--append', metavar='CSV',
+                        help='clean only these new rows onto covidResult.csv, using the saved province aggregates')
+    parser.add_argument('--state', default='covid_state.json',
+                        help='location of the saved aggregates used by --append; built from covidTrain.csv if missing')
+    parser.add_argument('--stale', default='covidStale.csv',
+                        help='where --append lists earlier imputations whose province mean or mode changed')
+    args = parser.parse_args()
+    if args.append and args.nearest_province:
+        parser.error('--nearest-province cannot be combined with --append')
+    pipeline = Pipeline(covid_rules(args.vectorized, args.approximate, args.nearest_province, args.synonyms))
+    if args.append:
+        try:
+            stale = append_rows(pipeline, args.append, args.state, args.stale)
+        except ValueError as error:
+            # e.g. a state saved for other columns or rules
+            parser.error(str(error))
+        print(f"{len(stale)} earlier imputations changed, listed in {args.stale}")
+    elif args.workers > 1:
+        pipeline.run_parallel('covidTrain.csv', 'covidResult.csv', args.workers, args.batch_size)
+    elif args.stream:
+        pipeline.run_stream('covidTrain.csv', 'covidResult.csv', args.batch_size)
+    else:
+        # Load the dataset, apply every task in one read pass and one write pass, and save
+        covid_data = ColumnStore.from_csv('covidTrain.csv')
+        pipeline.run(covid_data)
+        covid_data.to_csv('covidResult.csv')
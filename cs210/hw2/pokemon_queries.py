@@ -0,0 +1,96 @@
+import csv
+import io
+
+from bitmap_table import BitmapTable
+from cleaning import ColumnStore, Pipeline, most_common_of_counts, round_value
+import pokemon
+
+# ------------------------------------------------------------
+# Pokemon Tasks on the Bitmap-Indexed Table
+# ------------------------------------------------------------
+
+categorical = ['type', 'weakness', 'personality', 'stage']
+numeric = ['level', 'hp']
+
+def index_pokemon(store):
+    """Index the pokemon columns that the tasks filter on."""
+    return BitmapTable(store, categorical=categorical, numeric=numeric)
+
+# Task 1: Percentage of fire type Pokemons at or above level 40
+def fire_percentage_text(table):
+    fire = table.equals('type', 'fire')
+    num_fire = table.count(fire)
+    percentage = (table.count(fire & table.in_range('level', low=40)) / num_fire) * 100 if num_fire else 0
+    return f"Percentage of fire type Pokemons at or above level 40 = {int(round_value(percentage))}"
+
+# Task 2: Most common type per weakness, for the rows missing a type
+def type_fills(table):
+    missing_type = table.everything() & ~table.present('type')
+    fills = []
+    for weakness, weakness_rows in table.bitmaps['weakness'].items():
+        most_common = most_common_of_counts(table.value_counts('type', weakness_rows))
+        fills += [('type', row, most_common) for row in table.rows(weakness_rows & missing_type)]
+    return fills
+
+# Task 3: Level band average per stat, for the rows missing that stat
+def stat_fills(table, stats=pokemon.stats):
+    bands = [table.in_range('level', low=40, low_inclusive=False), table.in_range('level', high=40)]
+    fills = []
+    for stat in stats:
+        missing_stat = table.everything() & ~table.present(stat)
+        for band in bands:
+            if not table.count(band):
+                continue
+            mean = table.mean(stat, band)
+            fill = round_value(mean, 1) if mean is not None else 0
+            fills += [(stat, row, fill) for row in table.rows(band & missing_stat)]
+    return fills
+
+# Task 4: Pokemon type to personality mapping
+def type_personalities_text(table):
+    lines = ["Pokemon type to personality mapping:\n"]
+    for type_ in sorted(table.bitmaps['type']):
+        personalities = sorted(table.value_counts('personality', table.equals('type', type_)))
+        if personalities:
+            lines.append(f"   {type_}: {', '.join(personalities)}\n")
+    return ''.join(lines)
+
+# Task 5: Average HP for stage 3.0 Pokemons
+def stage_hp_text(table):
+    hp_values = table.values('hp', table.equals('stage', 3.0))
+    avg_hp = int(round_value(sum(hp_values) / len(hp_values))) if hp_values else 0
+    return f"Average hit point for Pokemons of stage 3.0 = {avg_hp}"
+
+def table_csv(store):
+    """Render a table's rows as CSV text."""
+    output = io.StringIO()
+    store.write_rows(csv.writer(output))
+    return output.getvalue()
+
+# Regression check: the indexed tasks must agree with pokemon.py
+def main():
+    # Tasks 1 to 3 on the raw data, then Tasks 4 and 5 on the filled data
+    indexed = ColumnStore.from_csv('pokemonTrain.csv')
+    table = index_pokemon(indexed)
+    texts = {'pokemon1.txt': fire_percentage_text(table)}
+    for column, row, value in type_fills(table) + stat_fills(table):
+        indexed[column].set(row, value)
+    table = index_pokemon(indexed)
+    texts['pokemon4.txt'] = type_personalities_text(table)
+    texts['pokemon5.txt'] = stage_hp_text(table)
+
+    # The same tasks the way pokemon.py runs them, writing its report files
+    scanned = ColumnStore.from_csv('pokemonTrain.csv')
+    pokemon.write_fire_percentage([scanned])
+    Pipeline(pokemon.pokemon_rules).run(scanned)
+    pokemon.write_type_personalities([scanned])
+    pokemon.write_stage_hp([scanned])
+
+    assert table_csv(indexed) == table_csv(scanned), 'indexed Tasks 2 and 3 fill different values'
+    for file_name, text in texts.items():
+        with open(file_name) as f:
+            assert f.read() == text, f'indexed task differs from {file_name}'
+    print('indexed tasks match pokemon.py')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import csv
+import hashlib
+import json
+from collections import deque
+
+from cleaning import is_nan
+
+# ------------------------------------------------------------
+# Symptom Canonicalization
+# ------------------------------------------------------------
+
+# Separator between the symptoms of one row
+SYMPTOM_SEPARATOR = ';'
+
+class SymptomNormalizer:
+    """Map a row's symptom list to canonical symptom ids in one pass, using an Aho-Corasick automaton over a
+    synonym dictionary.
+
+    Text is lowercased and runs of whitespace collapse to one space. Within each `;`-separated item, dictionary
+    phrases are matched at word boundaries, leftmost-longest and without overlaps, so "Fever ", "high fever" and
+    "fever 37.7 C" all count as fever. An item with no dictionary phrase is its own symptom. Dictionary symptoms
+    get the first ids, in alphabetical order; other symptoms are numbered as they are first seen."""
+
+    def __init__(self, synonyms):
+        # Digest of the dictionary, telling normalizers built from different dictionaries apart
+        self.digest = hashlib.sha1(json.dumps(sorted(synonyms.items())).encode('utf-8')).hexdigest()
+        # Symptom names by id, and the reverse lookup
+        self.names = sorted(set(synonyms.values()))
+        self.ids = {name: number for number, name in enumerate(self.names)}
+        # Automaton: transitions, failure links and the dictionary phrases ending at each state
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        # Per dictionary phrase: its length and canonical id
+        self.phrases = []
+        for synonym, canonical in synonyms.items():
+            self.add_phrase(' '.join(synonym.lower().split()), self.ids[canonical])
+        self.link()
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """Load a synonym,canonical dictionary."""
+        with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+            return cls({row['synonym']: row['canonical'] for row in csv.DictReader(file)})
+
+    def signature(self):
+        """Describe the normalizer for a rule signature."""
+        return ['SymptomNormalizer', self.digest]
+
+    def add_phrase(self, phrase, symptom_id):
+        """Add one dictionary phrase to the trie."""
+        state = 0
+        for char in phrase:
+            following = self.goto[state].get(char)
+            if following is None:
+                following = len(self.goto)
+                self.goto[state][char] = following
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = following
+        self.output[state].append(len(self.phrases))
+        self.phrases.append((len(phrase), symptom_id))
+
+    def link(self):
+        """Set failure links breadth first, merging each state's outputs with its failure state's."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(char, 0)
+                if self.fail[following] == following:
+                    self.fail[following] = 0
+                self.output[following] = self.output[following] + self.output[self.fail[following]]
+
+    def symptom_id(self, name):
+        """Return the id of a symptom name, numbering it if new."""
+        number = self.ids.get(name)
+        if number is None:
+            number = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return number
+
+    def name_of(self, symptom_id):
+        """Return the symptom name for an id."""
+        return self.names[symptom_id]
+
+    def __call__(self, text):
+        """Return the canonical ids of the symptoms in a row's symptom list, in order."""
+        found = []
+        item = []
+        matches = []
+        state = 0
+        for char in text.lower() + SYMPTOM_SEPARATOR:
+            if char == SYMPTOM_SEPARATOR:
+                self.finish_item(''.join(item).rstrip(), matches, found)
+                item, matches, state = [], [], 0
+                continue
+            if char.isspace():
+                # Collapse whitespace, and drop it at the start of an item
+                if not item or item[-1] == ' ':
+                    continue
+                char = ' '
+            item.append(char)
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for phrase in self.output[state]:
+                length, symptom_id = self.phrases[phrase]
+                matches.append((len(item) - length, len(item), symptom_id))
+        return found
+
+    def finish_item(self, item, matches, found):
+        """Add the ids of one item: its word-bounded dictionary matches, or the item itself if there are none."""
+        if is_nan(item):
+            return
+        # Leftmost-longest matches that start and end on word boundaries, without overlaps
+        matches.sort(key=lambda match: (match[0], -match[1]))
+        position = 0
+        matched = False
+        for start, end, symptom_id in matches:
+            if start < position:
+                continue
+            if start > 0 and item[start - 1].isalnum() or end < len(item) and item[end].isalnum():
+                continue
+            found.append(symptom_id)
+            position = end
+            matched = True
+        if not matched:
+            found.append(self.symptom_id(item))
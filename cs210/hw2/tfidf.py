@@ -1,6 +1,18 @@
+import argparse
+import hashlib
+import heapq
+import json
+import os
 import re
 import math
+import struct
+import zlib
+from array import array
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+import numpy as np
 
 # Retrieve text content from a specified file
 def fetch_text(file_location):
@@ -12,38 +24,111 @@ def save_text(file_location, data):
     with open(file_location, 'w', encoding='utf-8') as f:
         f.write(data)
 
+# Yield text content from a file in blocks of at most block_size characters
+def read_blocks(file_location, block_size):
+    with open(file_location, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+# Pattern for a URL start; the URL itself runs to the end of its whitespace-delimited chunk
+URL_PATTERN = re.compile(r'https?://\S')
+# Pattern for characters other than alphanumerics and underscores
+NON_WORD_PATTERN = re.compile(r'\W')
+# Number of distinct words whose stems are remembered
+STEM_CACHE_SIZE = 65536
+# Number of distinct raw chunks remembered while tokenizing one text
+CHUNK_CACHE_SIZE = 65536
+# Number of characters read at a time when streaming a document
+STREAM_BLOCK_SIZE = 1 << 20
+
+# Suffixes removed by the stemmer, checked in this order
+STEM_SUFFIXES = ('ing', 'ly', 'ment')
+
+# Apply stemming rules to a single word (unconditional like Ayush), caching repeated words
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem_token(token):
+    for suffix in STEM_SUFFIXES:
+        if token.endswith(suffix):
+            # Remove the suffix without length check
+            return token[:-len(suffix)]
+    # Keep word unchanged if no suffix matches
+    return token
+
+# Clean one whitespace-delimited chunk into a stemmed token, or None if nothing is kept
+def normalize_chunk(chunk, stop_list):
+    # Cut a URL, which runs from 'http(s)://' to the end of the chunk
+    if '://' in chunk:
+        url = URL_PATTERN.search(chunk)
+        if url:
+            chunk = chunk[:url.start()]
+    # Keep only alphanumeric characters and underscores
+    if not chunk.isalnum():
+        chunk = NON_WORD_PATTERN.sub('', chunk)
+        # Drop chunks that were nothing but punctuation or a URL
+        if not chunk:
+            return None
+    # Convert to lowercase and remove stopwords
+    token = chunk.lower()
+    if token in stop_list:
+        return None
+    return stem_token(token)
+
+# Yield cleaned, stopword-free, stemmed tokens from raw text in a single pass
+def tokenize(original_text, stop_list, seen=None):
+    # Remember the outcome for each raw chunk, since natural text repeats them heavily
+    if seen is None:
+        seen = {}
+    # Punctuation and URL removal never cross whitespace, so each chunk is handled on its own
+    for chunk in original_text.split():
+        token = seen.get(chunk, False)
+        if token is False:
+            # Start over once the cache is full to keep memory bounded
+            if len(seen) >= CHUNK_CACHE_SIZE:
+                seen.clear()
+            token = seen[chunk] = normalize_chunk(chunk, stop_list)
+        if token is not None:
+            yield token
+
 # Process text by cleaning, removing stopwords, and stemming
 def prepare_text(original_text, stop_list):
-    # Remove URLs first
-    text = re.sub(r'https?://\S+', '', original_text)
-    # Keep only alphanumeric characters, underscores, and spaces
-    text = re.sub(r'[^\w\s]', '', text)
-    # Normalize multiple spaces to a single space and trim
-    text = re.sub(r'\s+', ' ', text.strip())
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Split into words and remove stopwords
-    tokens = [token for token in text.split() if token not in stop_list]
-    
-    # Apply stemming rules to each word (unconditional like Ayush)
-    reduced = []
-    for token in tokens:
-        if token.endswith('ing'):
-            # Remove 'ing' without length check
-            reduced.append(token[:-3])
-        elif token.endswith('ly'):
-            # Remove 'ly' without length check
-            reduced.append(token[:-2])
-        elif token.endswith('ment'):
-            # Remove 'ment' without length check
-            reduced.append(token[:-4])
-        else:
-            # Keep word unchanged if no suffix matches
-            reduced.append(token)
-    
     # Join stemmed words back into a string
-    return ' '.join(reduced)
+    return ' '.join(tokenize(original_text, stop_list))
+
+# Yield lists of tokens from a file read in fixed-size blocks, so memory does not grow with file size
+def stream_tokens(file_location, stop_list, block_size=STREAM_BLOCK_SIZE):
+    # Chunk outcomes are shared across blocks
+    seen = {}
+    # Unfinished chunk from the end of the previous block
+    carry = ''
+    for block in read_blocks(file_location, block_size):
+        text = carry + block
+        # Hold back the trailing chunk, which may continue in the next block
+        if text[-1].isspace():
+            carry = ''
+        else:
+            parts = text.rsplit(None, 1)
+            text, carry = (parts[0], parts[1]) if len(parts) == 2 else ('', parts[0])
+        yield list(tokenize(text, stop_list, seen))
+    # Whatever is left at end of file is a complete chunk
+    yield list(tokenize(carry, stop_list, seen))
+
+# Preprocess a file block by block, writing the preproc_ output as it goes and returning term counts
+def stream_document(doc_name, stop_list, block_size=STREAM_BLOCK_SIZE):
+    term_counts = Counter()
+    with open(f'preproc_{doc_name}', 'w', encoding='utf-8') as f:
+        # Separate tokens across blocks exactly as ' '.join would
+        separator = ''
+        for tokens in stream_tokens(doc_name, stop_list, block_size):
+            if not tokens:
+                continue
+            f.write(separator + ' '.join(tokens))
+            separator = ' '
+            # Empty stems are kept in the text but, like str.split, not counted
+            term_counts.update(token for token in tokens if token)
+    return dict(term_counts)
 
 # Calculate term frequency for each word in the text
 def calculate_tf(text_data):
@@ -82,51 +167,612 @@ def calculate_tfidf(tf_scores, idf_scores):
     # Return the TF-IDF dict
     return tfidf_values
 
-# Pick the top 5 words by TF-IDF score, sorted appropriately
-def select_top_words(tfidf_dict):
-    # Sort by descending score, then alphabetically by term
-    ranked = sorted(tfidf_dict.items(), key=lambda item: (-item[1], item[0]))
-    # Return top 5 items
-    return ranked[:5]
+# Corpus of term counts stored as a CSR-style sparse matrix over a shared vocabulary
+class TermCorpus:
+    def __init__(self):
+        # Map each term to a dense integer id, assigned once on first sight
+        self.vocabulary = {}
+        # Terms in id order, for turning ids back into words
+        self.terms = []
+        # Document names in row order
+        self.doc_names = []
+        # Per-document (term ids, counts) blocks waiting to be packed into CSR arrays
+        self._pending = []
+        # CSR arrays: row offsets, column (term id) indices and count values
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    # Number of documents held in the corpus
+    def __len__(self):
+        return len(self.doc_names)
+
+    # Count the terms of one preprocessed document and append it as a new row
+    def add_document(self, doc_name, text_data):
+        # Count occurrences of each word in this document
+        self.add_counts(doc_name, Counter(text_data.split()))
+
+    # Append a document given as an already counted term -> count mapping
+    def add_counts(self, doc_name, term_counts):
+        # Translate terms to ids, growing the vocabulary for unseen terms
+        ids = np.empty(len(term_counts), dtype=np.int64)
+        for position, term in enumerate(term_counts):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = len(self.terms)
+                self.vocabulary[term] = term_id
+                self.terms.append(term)
+            ids[position] = term_id
+        counts = np.fromiter(term_counts.values(), dtype=np.int64, count=len(term_counts))
+        # Keep the block until the next vectorized computation needs it
+        self.doc_names.append(doc_name)
+        self._pending.append((ids, counts))
+
+    # Number of term columns in the matrix
+    def num_columns(self):
+        return len(self.terms)
+
+    # Pack pending document blocks into the CSR arrays
+    def _pack(self):
+        if not self._pending:
+            return
+        ids, counts = zip(*self._pending)
+        row_lengths = np.fromiter((len(block) for block in ids), dtype=np.int64, count=len(ids))
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(row_lengths)])
+        self.indices = np.concatenate([self.indices, *ids])
+        self.counts = np.concatenate([self.counts, *counts])
+        self._pending = []
+
+    # Row id of every stored entry, aligned with self.indices
+    def row_ids(self):
+        self._pack()
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    # Number of documents each term appears in, indexed by term id, optionally counting documents by weight
+    def document_frequencies(self, doc_weights=None):
+        self._pack()
+        if doc_weights is None:
+            return np.bincount(self.indices, minlength=self.num_columns())
+        return np.bincount(self.indices, weights=doc_weights[self.row_ids()], minlength=self.num_columns())
+
+    # IDF per term id, using the same log(N / df) + 1 formula as calculate_idf
+    def idf(self, doc_freq=None, num_texts=None):
+        # Default to frequencies and document count of this corpus alone
+        if doc_freq is None:
+            doc_freq = self.document_frequencies()
+        if num_texts is None:
+            num_texts = len(self)
+        # Columns no document uses get an infinite IDF, which is never looked up
+        with np.errstate(divide='ignore'):
+            return np.log(num_texts / doc_freq) + 1
+
+    # TF for every stored (document, term) entry, aligned with self.indices
+    def tf(self):
+        row_ids = self.row_ids()
+        # Total number of words per document
+        row_totals = np.bincount(row_ids, weights=self.counts, minlength=len(self))
+        return self.counts / row_totals[row_ids]
+
+    # Unrounded TF-IDF for every stored entry, aligned with self.indices
+    def tfidf(self, idf_values=None):
+        if idf_values is None:
+            idf_values = self.idf()
+        return self.tf() * idf_values[self.indices]
+
+    # TF-IDF dict for one document, rounded to 2 decimals like calculate_tfidf
+    def document_tfidf(self, row, scores):
+        start, end = self.indptr[row], self.indptr[row + 1]
+        terms = [self.terms[term_id] for term_id in self.indices[start:end].tolist()]
+        return {term: round(score, 2) for term, score in zip(terms, scores[start:end].tolist())}
+
+# TermCorpus variant that hashes terms into a fixed number of buckets, so memory does not grow with vocabulary size.
+# Terms sharing a bucket are counted together: with V distinct terms in B buckets, a given term shares its bucket
+# with at least one other about 1 - exp(-V / B) of the time (~9% for 100k terms in 2**20 buckets, ~63% when V == B).
+# A shared bucket sums its terms' counts and takes the document frequency of their union, so a rare term that collides
+# with a common one has its IDF understated. In each document a bucket is reported under that document's most
+# frequent term in it, so reported words always occur in the document.
+class HashedTermCorpus(TermCorpus):
+    def __init__(self, num_buckets=1 << 20):
+        super().__init__()
+        # Fixed number of term columns
+        self.num_buckets = num_buckets
+        # Reverse map from bucket to the first term hashed into it, at most one entry per bucket
+        self.terms = {}
+        # (row, bucket) -> the document's own name for the bucket, only where it differs from the first term
+        self.doc_terms = {}
+
+    # Number of term columns in the matrix
+    def num_columns(self):
+        return self.num_buckets
+
+    # Bucket of a term; crc32 is stable across processes, unlike the built-in hash()
+    def bucket_of(self, term):
+        return zlib.crc32(term.encode('utf-8')) % self.num_buckets
+
+    # Append a document given as a term -> count mapping, merging terms that share a bucket
+    def add_counts(self, doc_name, term_counts):
+        bucket_counts = {}
+        # Per bucket: this document's most frequent term in it, the first seen on ties, and its count
+        bucket_terms = {}
+        for term, count in term_counts.items():
+            bucket = self.bucket_of(term)
+            bucket_counts[bucket] = bucket_counts.get(bucket, 0) + count
+            if count > bucket_terms.get(bucket, (None, 0))[1]:
+                bucket_terms[bucket] = (term, count)
+        # Remember a readable name for each bucket, and this document's own name where it differs
+        row = len(self.doc_names)
+        for bucket, (term, _) in bucket_terms.items():
+            if self.terms.setdefault(bucket, term) != term:
+                self.doc_terms[row, bucket] = term
+        ids = np.fromiter(bucket_counts.keys(), dtype=np.int64, count=len(bucket_counts))
+        counts = np.fromiter(bucket_counts.values(), dtype=np.int64, count=len(bucket_counts))
+        # Keep the block until the next vectorized computation needs it
+        self.doc_names.append(doc_name)
+        self._pending.append((ids, counts))
+
+    # TF-IDF dict for one document, naming each bucket after the document's own term in it
+    def document_tfidf(self, row, scores):
+        start, end = self.indptr[row], self.indptr[row + 1]
+        terms = [self.doc_terms.get((row, bucket)) or self.terms[bucket]
+                 for bucket in self.indices[start:end].tolist()]
+        return {term: round(score, 2) for term, score in zip(terms, scores[start:end].tolist())}
+
+# Mersenne prime used as the modulus of the MinHash permutations
+MINHASH_PRIME = (1 << 61) - 1
+# Number of shingles hashed together when computing signatures, to bound temporary arrays
+MINHASH_BATCH_SIZE = 8192
+
+# Yield lists of the words of a preprocessed file, read in blocks so memory does not grow with file size
+def read_words(file_location, block_size=STREAM_BLOCK_SIZE):
+    # Unfinished word from the end of the previous block
+    carry = ''
+    for block in read_blocks(file_location, block_size):
+        words = (carry + block).split(' ')
+        carry = words.pop()
+        yield [word for word in words if word]
+    if carry:
+        yield [carry]
+
+# Finds near-duplicate documents with MinHash signatures over word shingles and LSH banding
+class NearDuplicateDetector:
+    def __init__(self, num_perm=128, bands=16, shingle_size=3, threshold=0.8, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        # Signature length and its split into bands of equal rows
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Words per shingle
+        self.shingle_size = shingle_size
+        # Estimated Jaccard similarity a candidate pair needs to count as a duplicate
+        self.threshold = threshold
+        # Random permutations h -> (a * h + b) mod p; a < 2**31 and 32-bit h keep a * h + b within uint64
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, MINHASH_PRIME, num_perm, dtype=np.uint64)[:, None]
+
+    # MinHash signature of a preprocessed file, or None if it has no words
+    def signature(self, file_location):
+        signature = np.full(self.num_perm, MINHASH_PRIME, dtype=np.uint64)
+        # Last words of the previous block, so shingles continue across blocks
+        window = []
+        seen_words = False
+        for words in read_words(file_location):
+            if not words:
+                continue
+            seen_words = True
+            words = window + words
+            # Hash each shingle of consecutive words
+            hashes = np.fromiter((zlib.crc32(' '.join(words[i:i + self.shingle_size]).encode('utf-8'))
+                                  for i in range(max(1, len(words) - self.shingle_size + 1))), dtype=np.uint64)
+            window = words[-(self.shingle_size - 1):] if self.shingle_size > 1 else []
+            # Fold the minimum of every permutation into the signature, a batch of shingles at a time
+            for start in range(0, len(hashes), MINHASH_BATCH_SIZE):
+                batch = hashes[start:start + MINHASH_BATCH_SIZE]
+                np.minimum(signature, ((self.a * batch + self.b) % MINHASH_PRIME).min(axis=1), out=signature)
+        return signature if seen_words else None
+
+    # Group documents into near-duplicate clusters, returning lists of row numbers with more than one member
+    def find_clusters(self, signatures):
+        # Union-find over documents
+        parent = list(range(len(signatures)))
+        def find(row):
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+        # Documents whose signatures agree on a whole band land in the same bucket
+        for band in range(self.bands):
+            buckets = {}
+            start = band * self.rows
+            for row, signature in enumerate(signatures):
+                if signature is None:
+                    continue
+                key = signature[start:start + self.rows].tobytes()
+                candidates = buckets.setdefault(key, [])
+                # Join every earlier candidate, not yet in this row's cluster, whose full signature confirms the
+                # similarity, so which pairs are found does not depend on document order
+                for earlier in candidates:
+                    if find(earlier) != find(row) and np.mean(signatures[earlier] == signature) >= self.threshold:
+                        parent[find(row)] = find(earlier)
+                candidates.append(row)
+        clusters = defaultdict(list)
+        for row in range(len(signatures)):
+            clusters[find(row)].append(row)
+        return [members for members in clusters.values() if len(members) > 1]
+
+# Weight of each document in IDF once near-duplicates are collapsed (first member counts) or down-weighted (1 / size)
+def duplicate_weights(clusters, num_docs, mode):
+    doc_weights = np.ones(num_docs)
+    for members in clusters:
+        if mode == 'collapse':
+            doc_weights[members[1:]] = 0
+        else:
+            doc_weights[members] = 1 / len(members)
+    return doc_weights
+
+# Number of top words kept per document unless asked otherwise
+TOP_K = 5
+# Write buffer size for the consolidated output file
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Pick the top k words by TF-IDF score, sorted appropriately
+def select_top_words(tfidf_dict, k=TOP_K):
+    # Partial selection on a heap, by descending score, then alphabetically by term
+    return heapq.nsmallest(k, tfidf_dict.items(), key=lambda item: (-item[1], item[0]))
+
+# Persistent document-frequency table, updated as documents are added or removed
+class DocumentFrequencyStore:
+    def __init__(self, file_location, stop_key=''):
+        # Where the table lives on disk
+        self.file_location = file_location
+        # Fingerprint of the stopword list the stored counts were built with
+        self.stop_key = stop_key
+        # Number of documents in the corpus
+        self.doc_count = 0
+        # Number of documents each term appears in
+        self.doc_freq = {}
+        # Per document: file stamp, term counts and last written TF-IDF output
+        self.documents = {}
+
+    # Load the table from disk, starting empty if missing or built with other stopwords
+    @classmethod
+    def load(cls, file_location, stop_key=''):
+        store = cls(file_location, stop_key)
+        if not os.path.exists(file_location):
+            return store
+        with open(file_location, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('stop_key') != stop_key:
+            return store
+        store.doc_count = state['doc_count']
+        store.doc_freq = state['doc_freq']
+        store.documents = state['documents']
+        return store
+
+    # Write the table to disk, replacing the old copy atomically
+    def save(self):
+        state = {
+            'stop_key': self.stop_key,
+            'doc_count': self.doc_count,
+            'doc_freq': self.doc_freq,
+            'documents': self.documents,
+        }
+        temp_location = f'{self.file_location}.tmp'
+        with open(temp_location, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_location, self.file_location)
+
+    # Add a document's term counts and bump the frequency of each of its terms
+    def add_document(self, doc_name, term_counts, stamp):
+        if doc_name in self.documents:
+            self.remove_document(doc_name)
+        for term in term_counts:
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+        self.doc_count += 1
+        self.documents[doc_name] = {'stamp': stamp, 'counts': dict(term_counts), 'output': None}
+
+    # Drop a document and decrement the frequency of each of its terms
+    def remove_document(self, doc_name):
+        entry = self.documents.pop(doc_name)
+        for term in entry['counts']:
+            remaining = self.doc_freq[term] - 1
+            if remaining:
+                self.doc_freq[term] = remaining
+            else:
+                del self.doc_freq[term]
+        self.doc_count -= 1
+
+    # Whether the stored counts for a document still match the file on disk
+    def is_current(self, doc_name, stamp):
+        entry = self.documents.get(doc_name)
+        return entry is not None and entry['stamp'] == stamp
+
+# Identify a file's current version by modification time and size
+def file_stamp(file_location):
+    info = os.stat(file_location)
+    return [info.st_mtime_ns, info.st_size]
+
+# Format top words as a single-line list of tuples
+def format_top_words(top_words):
+    return '[' + ', '.join(f"('{word}', {score:.2f})" for word, score in top_words) + ']'
+
+# On-disk cache of preprocessed documents, keyed by raw content, stopwords and stemming rules
+class PreprocessCache:
+    # Entry layout: zlib-compressed preprocessed text, zlib-compressed terms, counts, then this footer
+    FOOTER = struct.Struct('<4sQQQ')
+    MAGIC = b'TFC1'
+    # Bump when tokenizer behaviour changes so old entries stop matching
+    VERSION = '1'
+
+    def __init__(self, directory, max_bytes, stop_words):
+        # Directory holding one file per cached document
+        self.directory = directory
+        # Total size the cache is trimmed back to, least recently used entries first
+        self.max_bytes = max_bytes
+        # Everything besides the document itself that decides the preprocessed output
+        rules = '\n'.join([self.VERSION, ' '.join(STEM_SUFFIXES), *sorted(stop_words)])
+        self.rules_key = hashlib.sha1(rules.encode('utf-8')).digest()
+        os.makedirs(directory, exist_ok=True)
+
+    # Hash a document's raw bytes together with the rules
+    def key_for(self, file_location):
+        digest = hashlib.sha1(self.rules_key)
+        with open(file_location, 'rb') as f:
+            for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    # Location of a cache entry
+    def entry_location(self, key):
+        return os.path.join(self.directory, f'{key}.bin')
+
+    # Write a cached document's preprocessed text to output_location and return its term counts, or None on a miss
+    def load(self, key, output_location):
+        entry_location = self.entry_location(key)
+        try:
+            with open(entry_location, 'rb') as f:
+                # Read the footer to find the sections
+                f.seek(-self.FOOTER.size, os.SEEK_END)
+                magic, text_size, terms_size, num_terms = self.FOOTER.unpack(f.read(self.FOOTER.size))
+                if magic != self.MAGIC:
+                    return None
+                f.seek(text_size)
+                terms = zlib.decompress(f.read(terms_size)).decode('utf-8').split('\n') if num_terms else []
+                counts = array('Q')
+                counts.frombytes(f.read(num_terms * counts.itemsize))
+                # Decompress the text into the output file block by block
+                f.seek(0)
+                decompressor = zlib.decompressobj()
+                remaining = text_size
+                with open(output_location, 'wb') as out:
+                    while remaining:
+                        block = f.read(min(remaining, STREAM_BLOCK_SIZE))
+                        remaining -= len(block)
+                        out.write(decompressor.decompress(block))
+                    out.write(decompressor.flush())
+        except (OSError, ValueError, zlib.error, struct.error):
+            return None
+        # Mark the entry as recently used
+        os.utime(entry_location)
+        return dict(zip(terms, counts))
+
+    # Store a document's preprocessed text, given as blocks, and its term counts
+    def store(self, key, text_blocks, term_counts):
+        entry_location = self.entry_location(key)
+        # Write to a private temporary file so concurrent workers never see half an entry
+        temp_location = f'{entry_location}.{os.getpid()}.tmp'
+        with open(temp_location, 'wb') as f:
+            compressor = zlib.compressobj()
+            for block in text_blocks:
+                f.write(compressor.compress(block.encode('utf-8')))
+            f.write(compressor.flush())
+            text_size = f.tell()
+            terms = zlib.compress('\n'.join(term_counts).encode('utf-8'))
+            f.write(terms)
+            f.write(array('Q', term_counts.values()).tobytes())
+            f.write(self.FOOTER.pack(self.MAGIC, text_size, len(terms), len(term_counts)))
+        os.replace(temp_location, entry_location)
+
+    # Evict least recently used entries until the cache fits in max_bytes
+    def trim(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                info = entry.stat()
+                entries.append((info.st_mtime_ns, info.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            os.remove(path)
+            total_size -= size
+
+# Stopwords used by preprocessing workers, sent once per worker process
+_worker_stop_words = None
+
+# Give a pool worker its copy of the stopwords
+def _init_worker(stop_words):
+    global _worker_stop_words
+    _worker_stop_words = stop_words
+
+# Preprocess one document, save its preproc_ file and return its term counts
+def preprocess_document(doc_name, stop_words=None, stream=False, cache=None):
+    # Fall back to the stopwords handed to this worker process
+    if stop_words is None:
+        stop_words = _worker_stop_words
+    # Reuse a cached result for unchanged content, skipping preprocessing entirely
+    if cache is not None:
+        key = cache.key_for(doc_name)
+        term_counts = cache.load(key, f'preproc_{doc_name}')
+        if term_counts is not None:
+            return term_counts
+    # Stream large documents instead of reading them whole
+    if stream:
+        term_counts = stream_document(doc_name, stop_words)
+        if cache is not None:
+            cache.store(key, read_blocks(f'preproc_{doc_name}', STREAM_BLOCK_SIZE), term_counts)
+        return term_counts
+    # Read, clean and save the document
+    processed_content = prepare_text(fetch_text(doc_name), stop_words)
+    save_text(f'preproc_{doc_name}', processed_content)
+    # Return only the compact term counts, not the processed text
+    term_counts = dict(Counter(processed_content.split()))
+    if cache is not None:
+        cache.store(key, [processed_content], term_counts)
+    return term_counts
+
+# Preprocess documents on a pool of worker processes, returning term counts in document order
+def count_documents(doc_names, stop_words, workers=1, stream=False, cache=None):
+    # Run in this process when no parallelism is requested
+    if workers <= 1 or len(doc_names) <= 1:
+        doc_counts = [preprocess_document(doc_name, stop_words, stream, cache) for doc_name in doc_names]
+    else:
+        # Hand out documents in batches so each task amortizes the inter-process overhead
+        chunk_size = max(1, len(doc_names) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(stop_words,)) as pool:
+            # map keeps results in input order, so output does not depend on the worker count
+            task = partial(preprocess_document, stream=stream, cache=cache)
+            doc_counts = list(pool.map(task, doc_names, chunksize=chunk_size))
+    # Evict old cache entries once all workers are done with it
+    if cache is not None:
+        cache.trim()
+    return doc_counts
 
 # Handle document processing and TF-IDF computation
-def process_documents():
-    # Load document list from file
-    doc_list = fetch_text('tfidf_docs.txt').splitlines()
+def process_documents(workers=1, stream=False, cache_location=None, cache_size=256, hash_buckets=0,
+                      top_k=TOP_K, output_location=None, dedup=None):
+    # Load document list from file, removing any trailing/leading whitespace from filenames; a file listed twice
+    # counts once, like the dict of processed texts this replaced
+    doc_list = list(dict.fromkeys(doc_name.strip() for doc_name in fetch_text('tfidf_docs.txt').splitlines()))
     
     # Load stopwords from file
     stop_words = set(fetch_text('stopwords.txt').splitlines())
     
-    # Initialize dict to store processed texts
-    processed_texts = {}
-    # Process each document in the list
-    for doc_name in doc_list:
-        # Remove any trailing/leading whitespace from filename
-        doc_name = doc_name.strip()
-        # Read raw content from document
-        raw_content = fetch_text(doc_name)
-        # Preprocess the content
-        processed_content = prepare_text(raw_content, stop_words)
-        # Store processed text
-        processed_texts[doc_name] = processed_content
-        # Save preprocessed text to file
-        save_text(f'preproc_{doc_name}', processed_content)
-    
-    # Calculate IDF values across all processed texts
-    idf_values = calculate_idf(processed_texts.values())
-    
-    # Compute and save TF-IDF for each document
-    for doc_name, processed_content in processed_texts.items():
-        # Calculate term frequencies
-        tf_values = calculate_tf(processed_content)
-        # Compute TF-IDF scores
-        tfidf_scores = calculate_tfidf(tf_values, idf_values)
-        # Get top 5 words by TF-IDF
-        top_words = select_top_words(tfidf_scores)
+    # Optionally reuse preprocessing results from earlier runs
+    cache = PreprocessCache(cache_location, cache_size << 20, stop_words) if cache_location else None
+    
+    # Preprocess every document, saving preproc_ files and counting terms
+    doc_counts = count_documents(doc_list, stop_words, workers, stream, cache)
+    
+    # Initialize corpus, hashing terms into a fixed number of buckets if asked, and merge counts in list order
+    corpus = HashedTermCorpus(hash_buckets) if hash_buckets else TermCorpus()
+    for doc_name, term_counts in zip(doc_list, doc_counts):
+        corpus.add_counts(doc_name, term_counts)
+    
+    # Optionally collapse or down-weight near-duplicate documents before computing IDF
+    idf_values = None
+    if dedup:
+        detector = NearDuplicateDetector()
+        signatures = [detector.signature(f'preproc_{doc_name}') for doc_name in doc_list]
+        doc_weights = duplicate_weights(detector.find_clusters(signatures), len(doc_list), dedup)
+        doc_freq = corpus.document_frequencies(doc_weights)
+        # Terms found only in collapsed duplicates keep their unweighted frequency, so their IDF stays finite
+        only_collapsed = doc_freq == 0
+        doc_freq[only_collapsed] = corpus.document_frequencies()[only_collapsed]
+        idf_values = corpus.idf(doc_freq, doc_weights.sum())
+    
+    # Compute TF-IDF for every document and term in one vectorized pass
+    scores = corpus.tfidf(idf_values)
+    
+    # Write every document's top words as JSON Lines to one buffered file instead of one file per document
+    if output_location:
+        with open(output_location, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+            for row, doc_name in enumerate(corpus.doc_names):
+                top_words = select_top_words(corpus.document_tfidf(row, scores), top_k)
+                f.write(json.dumps({'doc': doc_name, 'top_words': top_words}) + '\n')
+        return
+    
+    # Save TF-IDF for each document
+    for row, doc_name in enumerate(corpus.doc_names):
+        # Collect this document's rounded TF-IDF scores
+        tfidf_scores = corpus.document_tfidf(row, scores)
+        # Get top k words by TF-IDF
+        top_words = select_top_words(tfidf_scores, top_k)
         # Format output as a single-line list of tuples
-        formatted_output = '[' + ', '.join(f"('{word}', {score:.2f})" for word, score in top_words) + ']'
+        formatted_output = format_top_words(top_words)
         # Save TF-IDF output to file
         save_text(f'tfidf_{doc_name}', formatted_output)
 
-# Execute the document processing directly
-process_documents()
\ No newline at end of file
+# Update TF-IDF outputs using the stored document frequencies, preprocessing only new or changed documents
+def process_documents_incremental(state_location='tfidf_state.json', workers=1, stream=False,
+                                  cache_location=None, cache_size=256, top_k=TOP_K):
+    # Load document list from file
+    doc_list = [doc_name.strip() for doc_name in fetch_text('tfidf_docs.txt').splitlines()]
+    
+    # Load stopwords from file
+    stop_text = fetch_text('stopwords.txt')
+    stop_words = set(stop_text.splitlines())
+    
+    # Load the stored table; a different stopword list invalidates it
+    stop_key = hashlib.sha1(stop_text.encode('utf-8')).hexdigest()
+    store = DocumentFrequencyStore.load(state_location, stop_key)
+    
+    # Forget documents that were dropped from the list
+    for doc_name in set(store.documents) - set(doc_list):
+        store.remove_document(doc_name)
+    
+    # Optionally reuse preprocessing results from earlier runs
+    cache = PreprocessCache(cache_location, cache_size << 20, stop_words) if cache_location else None
+    
+    # Preprocess only documents that are new or changed on disk
+    stamps = {doc_name: file_stamp(doc_name) for doc_name in doc_list}
+    pending = [doc_name for doc_name in doc_list if not store.is_current(doc_name, stamps[doc_name])]
+    for doc_name, term_counts in zip(pending, count_documents(pending, stop_words, workers, stream, cache)):
+        store.add_document(doc_name, term_counts, stamps[doc_name])
+    
+    # Rebuild the sparse counts from the store and score with its frequency table
+    corpus = TermCorpus()
+    for doc_name in doc_list:
+        corpus.add_counts(doc_name, store.documents[doc_name]['counts'])
+    doc_freq = np.array([store.doc_freq[term] for term in corpus.terms], dtype=np.int64)
+    scores = corpus.tfidf(corpus.idf(doc_freq, store.doc_count))
+    
+    # Rewrite only the outputs whose top words or scores changed
+    for row, doc_name in enumerate(corpus.doc_names):
+        formatted_output = format_top_words(select_top_words(corpus.document_tfidf(row, scores), top_k))
+        entry = store.documents[doc_name]
+        if entry['output'] != formatted_output:
+            save_text(f'tfidf_{doc_name}', formatted_output)
+            entry['output'] = formatted_output
+    
+    # Persist the updated table
+    store.save()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute top TF-IDF words for the documents in tfidf_docs.txt')
+    parser.add_argument('--incremental', action='store_true',
+                        help='reuse the stored document-frequency table and only process new or changed documents')
+    parser.add_argument('--state', default='tfidf_state.json',
+                        help='location of the document-frequency table used by --incremental')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes used to preprocess documents')
+    parser.add_argument('--stream', action='store_true',
+                        help='read documents in blocks instead of whole, for very large files')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='directory caching preprocessed documents by content hash')
+    parser.add_argument('--cache-size', type=int, default=256, metavar='MB',
+                        help='size the cache is trimmed to, evicting least recently used entries')
+    parser.add_argument('--hash-buckets', type=int, default=0, metavar='N',
+                        help='hash terms into N buckets to bound vocabulary memory; colliding terms are merged '
+                             '(see HashedTermCorpus for the expected error)')
+    parser.add_argument('--top-k', type=int, default=TOP_K, metavar='K',
+                        help='number of top words reported per document')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write all results to one JSON Lines file instead of a tfidf_ file per document')
+    parser.add_argument('--dedup', choices=['collapse', 'downweight'],
+                        help='find near-duplicate documents and count each cluster once (collapse) '
+                             'or split one document of weight across it (downweight) when computing IDF')
+    args = parser.parse_args()
+    if args.dedup and args.incremental:
+        parser.error('--dedup cannot be combined with --incremental')
+    if args.hash_buckets and args.incremental:
+        parser.error('--hash-buckets cannot be combined with --incremental')
+    if args.output and args.incremental:
+        parser.error('--output cannot be combined with --incremental')
+    # Execute the document processing directly
+    if args.incremental:
+        process_documents_incremental(args.state, args.workers, args.stream, args.cache, args.cache_size, args.top_k)
+    else:
+        process_documents(args.workers, args.stream, args.cache, args.cache_size, args.hash_buckets,
+                          args.top_k, args.output, args.dedup)
\ No newline at end of file
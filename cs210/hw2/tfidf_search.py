@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+from bisect import bisect_left
+
+from tfidf import calculate_idf, calculate_tf, fetch_text, file_stamp, prepare_text
+
+# Inverted index of length-normalized TF-IDF weights, answering top-k cosine similarity queries
+class InvertedIndex:
+    def __init__(self, doc_names, tf_by_doc, idf_scores, stop_words):
+        # Document names by integer doc id
+        self.doc_names = list(doc_names)
+        # IDF per term, also used to weight query terms
+        self.idf_scores = idf_scores
+        # Stopwords applied to queries, same as to documents
+        self.stop_words = stop_words
+        # Per term: doc ids in increasing order and the matching normalized weights
+        self.postings = {}
+        # Per term: the largest normalized weight in its postings, an upper bound for pruning
+        self.max_weight = {}
+        for doc_id, tf_scores in enumerate(tf_by_doc):
+            # Unrounded TF-IDF weights for this document
+            weights = {term: tf * idf_scores.get(term, 0) for term, tf in tf_scores.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            if not norm:
+                continue
+            # Doc ids are visited in order, so every posting list stays sorted
+            for term, weight in weights.items():
+                doc_ids, doc_weights = self.postings.setdefault(term, ([], []))
+                doc_ids.append(doc_id)
+                doc_weights.append(weight / norm)
+        for term, (_, doc_weights) in self.postings.items():
+            self.max_weight[term] = max(doc_weights)
+
+    # Build an index from preprocessed document texts
+    @classmethod
+    def from_texts(cls, doc_names, processed_texts, stop_words):
+        processed_texts = list(processed_texts)
+        idf_scores = calculate_idf(processed_texts)
+        return cls(doc_names, [calculate_tf(text) for text in processed_texts], idf_scores, stop_words)
+
+    # Write the index to disk with a key naming what it was built from, replacing the old copy atomically
+    def save(self, file_location, key):
+        state = {'key': key, 'doc_names': self.doc_names, 'idf_scores': self.idf_scores, 'postings': self.postings}
+        temp_location = f'{file_location}.tmp'
+        with open(temp_location, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_location, file_location)
+
+    # Load an index saved with the same key, or return None if there is none or it was built from other inputs
+    @classmethod
+    def load(cls, file_location, key, stop_words):
+        if not os.path.exists(file_location):
+            return None
+        with open(file_location, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('key') != key:
+            return None
+        index = cls([], [], state['idf_scores'], stop_words)
+        index.doc_names = state['doc_names']
+        index.postings = {term: (doc_ids, doc_weights) for term, (doc_ids, doc_weights) in state['postings'].items()}
+        index.max_weight = {term: max(doc_weights) for term, (_, doc_weights) in index.postings.items()}
+        return index
+
+    # Normalized TF-IDF weights of a query, run through the same preprocessing as documents
+    def query_weights(self, query):
+        tf_scores = calculate_tf(prepare_text(query, self.stop_words))
+        weights = {term: tf * self.idf_scores[term] for term, tf in tf_scores.items() if term in self.postings}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {term: weight / norm for term, weight in weights.items()} if norm else {}
+
+    # Return the k best (doc name, cosine similarity) pairs, ties going to the earlier document
+    def search(self, query, k=10, prune=True):
+        weights = self.query_weights(query)
+        if not weights or k <= 0:
+            return []
+        # Order query terms by the most they can add to any document's score, smallest first
+        terms = sorted(weights, key=lambda term: weights[term] * self.max_weight[term])
+        bounds = [weights[term] * self.max_weight[term] for term in terms]
+        # prefix_bounds[i] is the most terms[0..i] can add together
+        prefix_bounds = []
+        running = 0.0
+        for bound in bounds:
+            running += bound
+            prefix_bounds.append(running)
+        postings = [self.postings[term] for term in terms]
+        cursors = [0] * len(terms)
+        # Min-heap of (score, -doc id): the root is the current k-th best result
+        heap = []
+        threshold = -1.0
+        # Terms before `first_essential` cannot lift a document into the top k on their own (max-score)
+        first_essential = 0
+        while True:
+            # Next candidate is the smallest unseen doc id on any essential posting list
+            candidate = None
+            for i in range(first_essential, len(terms)):
+                doc_ids = postings[i][0]
+                if cursors[i] < len(doc_ids) and (candidate is None or doc_ids[cursors[i]] < candidate):
+                    candidate = doc_ids[cursors[i]]
+            if candidate is None:
+                break
+            # Score the candidate on the essential lists, advancing past it
+            score = 0.0
+            for i in range(first_essential, len(terms)):
+                doc_ids, doc_weights = postings[i]
+                if cursors[i] < len(doc_ids) and doc_ids[cursors[i]] == candidate:
+                    score += weights[terms[i]] * doc_weights[cursors[i]]
+                    cursors[i] += 1
+            # Add non-essential terms, largest bound first, while the candidate can still make the cut
+            for i in range(first_essential - 1, -1, -1):
+                if prune and score + prefix_bounds[i] <= threshold:
+                    break
+                doc_ids, doc_weights = postings[i]
+                cursors[i] = bisect_left(doc_ids, candidate, cursors[i])
+                if cursors[i] < len(doc_ids) and doc_ids[cursors[i]] == candidate:
+                    score += weights[terms[i]] * doc_weights[cursors[i]]
+            # Keep the candidate if it beats the current k-th best
+            entry = (score, -candidate)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
+            if prune and len(heap) == k:
+                threshold = heap[0][0]
+                # Move terms whose combined bound can no longer reach the threshold out of the essential set
+                while first_essential < len(terms) and prefix_bounds[first_essential] <= threshold:
+                    first_essential += 1
+        ranked = sorted(heap, key=lambda entry: (-entry[0], -entry[1]))
+        return [(self.doc_names[-doc_id], score) for score, doc_id in ranked]
+
+# Answer a query over the documents listed in tfidf_docs.txt
+def main():
+    parser = argparse.ArgumentParser(description='Rank the documents in tfidf_docs.txt against a keyword query')
+    parser.add_argument('query', help='keyword query, normalized like the documents')
+    parser.add_argument('-k', type=int, default=5, help='number of documents to return')
+    parser.add_argument('--index', default='tfidf_index.json',
+                        help='saved index, reused while the documents and stopwords are unchanged')
+    args = parser.parse_args()
+
+    # Load documents and stopwords
+    doc_list = [doc_name.strip() for doc_name in fetch_text('tfidf_docs.txt').splitlines()]
+    stop_text = fetch_text('stopwords.txt')
+    stop_words = set(stop_text.splitlines())
+
+    # Reuse the saved index if it was built from the same document versions and stopwords, else rebuild and save it
+    key = {'stop_key': hashlib.sha1(stop_text.encode('utf-8')).hexdigest(),
+           'documents': [[doc_name, file_stamp(doc_name)] for doc_name in doc_list]}
+    index = InvertedIndex.load(args.index, key, stop_words)
+    if index is None:
+        processed_texts = [prepare_text(fetch_text(doc_name), stop_words) for doc_name in doc_list]
+        index = InvertedIndex.from_texts(doc_list, processed_texts, stop_words)
+        index.save(args.index, key)
+
+    # Print the ranked documents
+    for doc_name, score in index.search(args.query, args.k):
+        print(f'{score:.4f}  {doc_name}')
+
+if __name__ == '__main__':
+    main()